@@ -0,0 +1,49 @@
+"""Awaitable counterparts of the storage functions, run on the dedicated I/O pool."""
+from typing import Dict, List, Optional
+from . import storage
+from .executors import run_io
+from .schemas import (
+    ProjectCreate, ProjectResponse, ProjectSchema, ProjectUpdate, ProjectPatch, ProjectPatchResult,
+    BuilderUser, BuilderUserCreate
+)
+
+async def create_user(user: BuilderUserCreate, hashed_password: str) -> BuilderUser:
+    return await run_io(storage.create_user, user, hashed_password)
+
+async def get_user_index() -> Dict[str, BuilderUser]:
+    # Recently checked index: a plain dict read, cheaper than a thread hop.
+    # Re-checking users.json may wait on a registration's lock, so it runs on the pool.
+    index = storage.fresh_user_index()
+    if index is None:
+        index = await run_io(storage.user_index)
+    return index
+
+async def get_user_by_email(email: str) -> Optional[BuilderUser]:
+    user = (await get_user_index()).get(email)
+    if user is None:
+        user = await run_io(storage.get_user_by_email, email)
+    return user
+
+async def create_project(project_in: ProjectCreate, owner_id: str) -> ProjectResponse:
+    return await run_io(storage.create_project, project_in, owner_id)
+
+async def list_projects(owner_id: str) -> List[ProjectResponse]:
+    return await run_io(storage.list_projects, owner_id)
+
+async def get_project(project_id: str) -> Optional[ProjectResponse]:
+    return await run_io(storage.get_project, project_id)
+
+async def get_project_owner(project_id: str) -> Optional[str]:
+    return await run_io(storage.get_project_owner, project_id)
+
+async def get_project_revision(project_id: str, revision: int) -> Optional[ProjectSchema]:
+    return await run_io(storage.get_project_revision, project_id, revision)
+
+async def update_project(project_id: str, update_data: ProjectUpdate) -> Optional[ProjectResponse]:
+    return await run_io(storage.update_project, project_id, update_data)
+
+async def patch_project(project_id: str, patch: ProjectPatch) -> Optional[ProjectPatchResult]:
+    return await run_io(storage.patch_project, project_id, patch)
+
+async def delete_project(project_id: str) -> bool:
+    return await run_io(storage.delete_project, project_id)
@@ -0,0 +1,391 @@
+"""Benchmarks for the code generator, the project storage and the builder API.
+
+Every measurement runs against synthetic fixtures built from a fixed seed, so two
+runs on the same machine exercise identical work. Results are written as JSON and
+can be compared between commits.
+
+Usage:
+    python -m app.benchmark [--suite generator] [--suite storage] [--suite api] [--quick] [--output results.json]
+    python -m app.benchmark --compare baseline.json            # run, then print changes against a baseline
+    python -m app.benchmark --compare baseline.json results.json  # compare two saved runs, no benchmarking
+
+Run it from the repository root: the API suite mounts ./static like the server does.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from . import storage
+from .schemas import FieldDefinition, IndexDefinition, ModelDefinition, ProjectSchema
+from .generator import engine
+from .generator.main_gen import generate_project_zip
+from .generator.models_gen import generate_models_file
+from .generator.schemas_gen import generate_schemas_file
+from .generator.admin_gen import generate_admin_file
+from .generator.seed_gen import generate_seed_file
+from .generator.bench_gen import generate_bench_file
+
+FIELD_TYPES = ["string", "int", "float", "boolean", "datetime", "text"]
+SUITES = ("generator", "storage", "api")
+
+# name -> synthetic_schema() arguments
+SCHEMA_FIXTURES = {
+    "models_10": dict(models=10),
+    "models_100": dict(models=100),
+    "models_1000": dict(models=1000),
+    "wide": dict(models=10, fields=200), # Few models with very many columns
+    "dense_relations": dict(models=100, relations=10), # Every model points at up to ten others
+}
+QUICK_SCHEMA_FIXTURES = ["models_10", "models_100", "wide", "dense_relations"]
+
+# name -> (projects, users); projects are spread over the first STORAGE_OWNERS users
+STORAGE_FIXTURES = {
+    "projects_1k": (1000, 10000),
+    "projects_10k": (10000, 10000),
+}
+QUICK_STORAGE_FIXTURES = ["projects_1k"]
+STORAGE_OWNERS = 100
+
+def synthetic_schema(models: int, fields: int = 6, relations: int = 1, seed: int = 0) -> ProjectSchema:
+    """A reproducible schema: `models` models with `fields` columns and up to `relations` foreign keys each.
+
+    Relations only point at earlier models, like a hand-written schema would.
+    """
+    rng = random.Random(seed)
+    definitions = {}
+    names = [f"Model{i}" for i in range(models)]
+    for i, name in enumerate(names):
+        field_defs = {
+            f"field_{j}": FieldDefinition(
+                type=rng.choice(FIELD_TYPES),
+                required=rng.random() < 0.7,
+                index=rng.random() < 0.1,
+            )
+            for j in range(fields)
+        }
+        targets = rng.sample(names[:i], min(i, relations))
+        relation_defs = {f"ref{k}_id": target for k, target in enumerate(targets)}
+        indexes = [IndexDefinition(fields=["field_0", "field_1"])] if fields >= 2 and rng.random() < 0.2 else []
+        definitions[name] = ModelDefinition(fields=field_defs, relations=relation_defs or None, indexes=indexes)
+    return ProjectSchema(models=definitions)
+
+# --- Measurement ---
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """Millisecond statistics over per-run durations in seconds."""
+    ordered = sorted(samples)
+    nearest = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "runs": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(nearest(0.5) * 1000, 3),
+        "p95_ms": round(nearest(0.95) * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+    }
+
+def measure(func: Callable[[], Any], repeat: int, setup: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    """Time `repeat` calls of `func`; `setup` runs untimed before each call."""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        began = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - began)
+    return summarize(samples)
+
+def peak_memory(func: Callable[[], Any], setup: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    """Peak Python heap allocated during one call (tracemalloc; this process only)."""
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_kib": round(peak / 1024, 1)}
+
+class Results:
+    def __init__(self):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, key: str, stats: Dict[str, Any]):
+        self.entries[key] = stats
+        print(f"  {key:<52} {format_stats(stats)}", flush=True)
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    parts = []
+    if "p50_ms" in stats:
+        parts.append(f"p50 {stats['p50_ms']:>10.3f} ms  p95 {stats['p95_ms']:>10.3f} ms  (n={stats['runs']})")
+    if "peak_kib" in stats:
+        parts.append(f"peak {stats['peak_kib']:>10.1f} KiB")
+    return "  ".join(parts)
+
+# --- Generator suite ---
+
+def clear_section_cache():
+    with engine._section_cache_lock:
+        engine._section_cache.clear()
+
+def bench_generator(results: Results, fixtures: List[str], repeat: int):
+    for name in fixtures:
+        schema = synthetic_schema(**SCHEMA_FIXTURES[name])
+        models = schema.models
+        runs = max(1, repeat // 3) if len(models) >= 1000 else repeat
+        print(f"generator/{name}: {len(models)} models", flush=True)
+
+        # Whole archive: cold renders every section, warm reuses them all
+        cold = measure(lambda: generate_project_zip(schema), runs, setup=clear_section_cache)
+        cold.update(peak_memory(lambda: generate_project_zip(schema), setup=clear_section_cache))
+        results.add(f"generator.{name}.zip_cold", cold)
+        generate_project_zip(schema)
+        results.add(f"generator.{name}.zip_warm", measure(lambda: generate_project_zip(schema), runs))
+
+        # Stages: per-model rendering, then assembling each merged file
+        results.add(f"generator.{name}.sections", measure(lambda: engine.render_model_sections(schema), runs, setup=clear_section_cache))
+        results.add(f"generator.{name}.routers", measure(lambda: list(engine.iter_model_routers(schema)), runs, setup=clear_section_cache))
+        sections = engine.render_model_sections(schema)
+        stages = {
+            "models_file": lambda: generate_models_file(models, [s.model_class for s in sections]),
+            "schemas_file": lambda: generate_schemas_file(models, [s.schemas for s in sections]),
+            "admin_file": lambda: generate_admin_file(models, [s.admin for s in sections]),
+            "seed_file": lambda: generate_seed_file(models, [s.seed for s in sections]),
+            "bench_file": lambda: generate_bench_file(schema),
+        }
+        for stage, func in stages.items():
+            results.add(f"generator.{name}.{stage}", measure(func, runs))
+
+# --- Storage suite ---
+
+@contextmanager
+def storage_at(directory: str, backend: str) -> Iterator[None]:
+    """Point the storage module at `directory` with a fresh store and users index."""
+    saved = {name: getattr(storage, name) for name in (
+        "STORAGE_DIR", "USERS_FILE", "PROJECTS_DB", "STORAGE_BACKEND", "LOCK_DIR", "_locks",
+        "_store", "_users_by_email", "_users_signature", "_users_checked_at",
+    )}
+    storage.STORAGE_DIR = directory
+    storage.USERS_FILE = os.path.join(directory, "users.json")
+    storage.PROJECTS_DB = os.path.join(directory, "projects.db")
+    storage.STORAGE_BACKEND = backend
+    storage.LOCK_DIR = os.path.join(directory, ".locks")
+    storage._locks = storage.KeyedLock(storage.LOCK_DIR)
+    storage._store = None
+    storage._users_by_email = {}
+    storage._users_signature = None
+    storage._users_checked_at = float("-inf")
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(storage, name, value)
+
+def user_email(n: int) -> str:
+    return f"user{n}@bench.example.com"
+
+def populate_storage(directory: str, backend: str, projects: int, users: int, schema: ProjectSchema) -> List[str]:
+    """Write `users` users and `projects` projects owned round-robin by the first owners. Returns owner ids."""
+    owner_ids = [str(uuid.UUID(int=n)) for n in range(users)]
+    with open(os.path.join(directory, "users.json"), "w") as f:
+        # Any hash will do: the benchmarks never log in as these users
+        json.dump([{"id": owner_ids[n], "email": user_email(n), "hashed_password": "x"} for n in range(users)], f)
+
+    with storage_at(directory, backend):
+        storage.init_storage()
+        store = storage.get_store()
+        began = datetime(2024, 1, 1)
+        schema_data = schema.dict()
+        for n in range(projects):
+            created = (began + timedelta(seconds=n)).isoformat()
+            store.insert({
+                "id": str(uuid.UUID(int=n)),
+                "name": f"Project {n}",
+                "created_at": created,
+                "updated_at": created,
+                "revision": 0,
+                "schema_data": schema_data,
+                "owner_id": owner_ids[n % min(users, STORAGE_OWNERS)],
+            })
+    return owner_ids
+
+def bench_storage(results: Results, fixtures: List[str], repeat: int, backends: List[str]):
+    schema = synthetic_schema(models=5)
+    for name in fixtures:
+        projects, users = STORAGE_FIXTURES[name]
+        for backend in backends:
+            directory = tempfile.mkdtemp(prefix=f"builder-bench-{backend}-")
+            try:
+                print(f"storage/{backend}/{name}: {projects} projects, {users} users", flush=True)
+                began = time.perf_counter()
+                owner_ids = populate_storage(directory, backend, projects, users, schema)
+                results.add(f"storage.{backend}.{name}.populate", summarize([time.perf_counter() - began]))
+
+                with storage_at(directory, backend):
+                    storage.init_storage()
+                    owner = owner_ids[0]
+                    project_id = str(uuid.UUID(int=projects // 2))
+                    prefix = f"storage.{backend}.{name}"
+                    results.add(f"{prefix}.list_projects", measure(lambda: storage.list_projects(owner), repeat))
+                    results.add(f"{prefix}.get_project", measure(lambda: storage.get_project(project_id), repeat * 10))
+                    email = user_email(users - 1)
+                    storage.get_user_by_email(email)
+                    results.add(f"{prefix}.get_user_by_email", measure(lambda: storage.get_user_by_email(email), repeat * 10))
+
+                    def forget_users():
+                        # Next lookup re-reads users.json, as after another worker's write
+                        storage._users_signature = None
+                        storage._users_checked_at = float("-inf")
+                    results.add(f"{prefix}.get_user_by_email_reload", measure(lambda: storage.get_user_by_email(email), repeat, setup=forget_users))
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+
+# --- API suite ---
+
+def bench_api(results: Results, repeat: int, models: int):
+    from fastapi.testclient import TestClient
+    from . import main
+    from .generator.cache import ZipCache
+
+    directory = tempfile.mkdtemp(prefix="builder-bench-api-")
+    try:
+        with storage_at(directory, storage.STORAGE_BACKEND), TestClient(main.app) as client:
+            print(f"api: project with {models} models", flush=True)
+            credentials = {"email": "bench@example.com", "password": "bench-password"}
+            client.post("/api/auth/register", json=credentials).raise_for_status()
+            token = client.post("/api/auth/token", data={"username": credentials["email"], "password": credentials["password"]})
+            token.raise_for_status()
+            client.headers["Authorization"] = f"Bearer {token.json()['access_token']}"
+
+            for n in range(20): # Something to list besides the benchmarked project
+                client.post("/api/projects", json={"name": f"Filler {n}"}).raise_for_status()
+            project = client.post("/api/projects", json={"name": "Benchmark"}).json()
+            schema = synthetic_schema(models=models)
+            updated = client.put(f"/api/projects/{project['id']}", json={"schema_data": schema.dict()})
+            updated.raise_for_status()
+            revision = updated.json()["revision"]
+            path = f"/api/projects/{project['id']}"
+
+            def request(method: str, url: str, **kwargs):
+                response = client.request(method, url, **kwargs)
+                response.raise_for_status()
+                return response
+
+            results.add("api.list_projects", measure(lambda: request("GET", "/api/projects"), repeat * 5))
+            results.add("api.get_project", measure(lambda: request("GET", path), repeat * 5))
+
+            def patch():
+                nonlocal revision
+                operation = {"op": "replace", "path": "/models/Model0/fields/field_0/required", "value": revision % 2 == 0}
+                revision = request("PATCH", path, json={"revision": revision, "operations": [operation]}).json()["revision"]
+            results.add("api.patch_project", measure(patch, repeat * 5))
+
+            # The patches above changed the schema, so the first download renders it
+            results.add("api.generate_first", measure(lambda: request("GET", f"{path}/generate"), 1))
+            results.add("api.generate_cached", measure(lambda: request("GET", f"{path}/generate"), repeat))
+            etag = request("GET", f"{path}/generate").headers["etag"]
+            results.add("api.generate_not_modified", measure(lambda: client.get(f"{path}/generate", headers={"If-None-Match": etag}), repeat * 5))
+
+            # A zip cache that holds nothing: every download regenerates (from warm sections)
+            saved_cache, main.zip_cache = main.zip_cache, ZipCache(max_bytes=0)
+            try:
+                results.add("api.generate_uncached", measure(lambda: request("GET", f"{path}/generate"), repeat))
+            finally:
+                main.zip_cache = saved_cache
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+# --- Reporting ---
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]):
+    """Print the p50 (and peak memory) change of every result both runs have."""
+    print(f"{'benchmark':<52} {'baseline':>12} {'current':>12} {'change':>8}")
+    old, new = baseline["results"], current["results"]
+    for key in sorted(set(old) & set(new)):
+        for metric, unit in (("p50_ms", "ms"), ("peak_kib", "KiB")):
+            if metric in old[key] and metric in new[key]:
+                before, after = old[key][metric], new[key][metric]
+                change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+                label = key if metric == "p50_ms" else f"{key} (memory)"
+                print(f"{label:<52} {before:>9.3f} {unit:<2} {after:>9.3f} {unit:<2} {change:>8}")
+    for key in sorted(set(new) - set(old)):
+        print(f"{key:<52} {'new':>12}")
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the generator, storage and builder API")
+    parser.add_argument("--suite", action="append", choices=SUITES, help="suite to run, repeatable (default: all)")
+    parser.add_argument("--quick", action="store_true", help="smaller fixtures and fewer runs, e.g. for CI")
+    parser.add_argument("--repeat", type=int, default=None, help="runs per measurement (default 5, 3 with --quick)")
+    parser.add_argument("--backend", action="append", choices=("sqlite", "json"), help="storage backend(s) to benchmark (default: both)")
+    parser.add_argument("--api-models", type=int, default=100, help="models in the API suite's project (default 100)")
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS", help="baseline JSON to compare against; with two files, only compare them")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes a baseline and at most one results file")
+    if args.compare and len(args.compare) == 2:
+        compare(load(args.compare[0]), load(args.compare[1]))
+        return
+
+    suites = args.suite or list(SUITES)
+    repeat = args.repeat or (3 if args.quick else 5)
+    results = Results()
+    began = time.perf_counter()
+    if "generator" in suites:
+        bench_generator(results, QUICK_SCHEMA_FIXTURES if args.quick else list(SCHEMA_FIXTURES), repeat)
+    if "storage" in suites:
+        bench_storage(results, QUICK_STORAGE_FIXTURES if args.quick else list(STORAGE_FIXTURES), repeat, args.backend or ["sqlite", "json"])
+    if "api" in suites:
+        bench_api(results, repeat, args.api_models)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "suites": suites,
+            "quick": args.quick,
+            "repeat": repeat,
+            "gen_executor": engine.GEN_EXECUTOR,
+            "gen_workers": engine.GEN_WORKERS,
+            "duration_s": round(time.perf_counter() - began, 1),
+        },
+        "results": results.entries,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Wrote {len(results.entries)} results to {args.output}")
+    if args.compare:
+        print()
+        compare(load(args.compare[0]), report)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,18 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
-from . import storage
+from . import async_storage
+from .schemas import BuilderUser
+from .executors import run_hash
 
 # SECURITY CONFIG (Builder App)
 SECRET_KEY = "BUILDER_SECRET_KEY_CHANGE_ME"
@@ -25,6 +32,13 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# Async variants: PBKDF2 runs on the bounded hashing pool, off the event loop
+async def verify_password_async(plain_password, hashed_password):
+    return await run_hash(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await run_hash(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -35,12 +49,72 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+class _TokenCache:
+    """Token digest -> resolved user, bounded by size and by each token's exp.
+
+    Entries hold the BuilderUser object the users index returned. That object
+    is replaced only when its user changes, so a hit is valid while the index
+    still maps the email to the very same object.
+    """
+
+    def __init__(self, max_entries: int, max_ttl: float):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[BuilderUser, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str, users: Dict[str, BuilderUser]) -> Optional[BuilderUser]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                user, expires_at = entry
+                if expires_at > time.time() and users.get(user.email) is user:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return user
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, user: BuilderUser, token_exp: Optional[float]):
+        expires_at = time.time() + self.max_ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            self._entries[key] = (user, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self._entries)}
+
+token_cache = _TokenCache(
+    max_entries=int(os.environ.get("BUILDER_TOKEN_CACHE_SIZE", "10000")),
+    max_ttl=float(os.environ.get("BUILDER_TOKEN_CACHE_TTL", "300")),
+)
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    # Fast path: this exact token was verified recently and its user hasn't changed
+    cache_key = token_cache.key(token)
+    user = token_cache.get(cache_key, await async_storage.get_user_index())
+    if user is not None:
+        return user
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -49,7 +123,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credentials_exception
         
-    user = storage.get_user_by_email(email)
+    user = await async_storage.get_user_by_email(email)
     if user is None:
         raise credentials_exception
+    token_cache.put(cache_key, user, payload.get("exp"))
     return user
@@ -0,0 +1,49 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+# Dedicated pools so a burst of logins (PBKDF2, CPU bound) cannot starve
+# project reads, and neither competes with Starlette's default threadpool.
+IO_WORKERS = int(os.environ.get("BUILDER_IO_WORKERS", "16"))
+HASH_WORKERS = int(os.environ.get("BUILDER_HASH_WORKERS", "0")) or (os.cpu_count() or 1)
+# Hash jobs admitted at once (running + queued); beyond that requests get 503
+HASH_MAX_PENDING = int(os.environ.get("BUILDER_HASH_MAX_PENDING", "0")) or HASH_WORKERS * 8
+
+_io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="builder-io")
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_slots = threading.BoundedSemaphore(HASH_MAX_PENDING)
+
+class Overloaded(Exception):
+    """Raised instead of queueing when the password hashing backlog is full."""
+
+async def run_io(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run blocking storage/generation work on the I/O pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, functools.partial(func, *args, **kwargs))
+
+async def run_hash(func: Callable[..., T], *args: Any) -> T:
+    """Run a password hash/verify on the bounded hashing pool, or raise Overloaded."""
+    if not _hash_slots.acquire(blocking=False):
+        raise Overloaded("Too many authentication requests in progress, retry shortly")
+    try:
+        future = _hash_executor.submit(func, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+    # The slot frees when the hash finishes, even if the client went away meanwhile
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return await asyncio.wrap_future(future)
+
+async def iterate_io(iterator: Iterator[T]) -> AsyncIterator[T]:
+    """Drive a blocking iterator (e.g. a zip stream) from the I/O pool."""
+    sentinel = object()
+    while True:
+        item = await run_io(next, iterator, sentinel)
+        if item is sentinel:
+            return
+        yield item
@@ -1,7 +1,8 @@
-from typing import Dict
+from typing import Dict, List, Optional
 from ..schemas import ModelDefinition
 
-def generate_admin_file(models: Dict[str, ModelDefinition]) -> str:
+def generate_admin_file(models: Dict[str, ModelDefinition], model_sections: Optional[List[List[str]]] = None) -> str:
+    # model_sections: pre-rendered generate_model_admin() output per model, in model order
     lines = [
         "from sqladmin import ModelView",
         "from . import models",
@@ -9,24 +10,31 @@ def generate_admin_file(models: Dict[str, ModelDefinition]) -> str:
     ]
     
     # Generate ModelView for each model
-    for model_name, model_def in models.items():
-        lines.append(f"class {model_name}Admin(ModelView, model=models.{model_name}):")
-        
-        # Column List (Display all fields)
-        fields = [f'"{f}"' for f in model_def.fields.keys()]
-        if model_name == "User":
-            fields = ['"id"', '"email"'] # Don't show password hash
-        else:
-            fields.insert(0, '"id"')
-            
-        lines.append(f"    column_list = [{', '.join(fields)}]")
-        lines.append("")
+    if model_sections is None:
+        model_sections = [generate_model_admin(model_name, model_def) for model_name, model_def in models.items()]
+    for section in model_sections:
+        lines.extend(section)
 
     # Always generate UserAdmin
     has_user = "User" in models
     if not has_user:
         lines.append("class UserAdmin(ModelView, model=models.User):")
-        lines.append("    column_list = ['id', 'email']")
+        lines.append("    column_list = ['id', 'email', 'is_active', 'is_admin']")
         lines.append("")
 
     return "\n".join(lines)
+
+def generate_model_admin(model_name: str, model_def: ModelDefinition) -> List[str]:
+    lines = []
+    lines.append(f"class {model_name}Admin(ModelView, model=models.{model_name}):")
+    
+    # Column List (Display all fields)
+    fields = [f'"{f}"' for f in model_def.fields.keys()]
+    if model_name == "User":
+        fields = ['"id"', '"email"', '"is_active"', '"is_admin"'] # Don't show password hash
+    else:
+        fields.insert(0, '"id"')
+        
+    lines.append(f"    column_list = [{', '.join(fields)}]")
+    lines.append("")
+    return lines
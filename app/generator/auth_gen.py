@@ -1,4 +1,210 @@
-def generate_auth_router() -> str:
+from ..schemas import AuthSettings
+
+AUTH_IMPORTS = """
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from passlib.context import CryptContext
+"""
+
+SYNC_AUTH_IMPORTS = """from sqlalchemy.orm import Session
+from . import database, models, schemas
+"""
+
+ASYNC_AUTH_IMPORTS = """from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from . import database, models, schemas
+"""
+
+AUTH_SETTINGS = """
+# SECURITY CONFIG
+SECRET_KEY = "CHANGE_THIS_TO_A_REAL_SECRET_KEY"
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+# Stateless: the principal comes from the token claims (user id, role, version); the user row
+# is only read once per AUTH_USER_CACHE_TTL per worker, to reject disabled users and revoked tokens
+AUTH_STATELESS = os.environ.get("AUTH_STATELESS", "__STATELESS__") == "1"
+AUTH_USER_CACHE_TTL = float(os.environ.get("AUTH_USER_CACHE_TTL", "__USER_CACHE_TTL__"))
+AUTH_USER_CACHE_SIZE = int(os.environ.get("AUTH_USER_CACHE_SIZE", "10000"))
+
+pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_password_hash(password):
+    return pwd_context.hash(password)
+"""
+
+ASYNC_HASHING = """
+# Hashing is CPU bound: keep it off the event loop
+async def verify_password_async(plain_password, hashed_password):
+    return await run_in_threadpool(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    return await run_in_threadpool(get_password_hash, password)
+"""
+
+AUTH_TOKENS = """
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+    else:
+        expire = datetime.utcnow() + timedelta(minutes=15)
+    to_encode.update({"exp": expire})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+def token_claims(user) -> dict:
+    # ver: bumping users.token_version (POST /auth/revoke) invalidates every token issued before
+    return {"sub": user.email, "uid": user.id, "adm": bool(user.is_admin), "ver": user.token_version}
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def decode_token(token: str) -> dict:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception()
+    if payload.get("sub") is None:
+        raise credentials_exception()
+    return payload
+
+def check_token(payload: dict, user):
+    \"\"\"The token must belong to an active user and carry their current version.\"\"\"
+    if user is None or not user.is_active or payload.get("ver", 0) != user.token_version:
+        raise credentials_exception()
+
+class Principal(NamedTuple):
+    \"\"\"The caller as the token describes them, resolved without loading the user.\"\"\"
+    id: int
+    email: str
+    is_admin: bool
+
+def principal_from(payload: dict, user) -> Principal:
+    check_token(payload, user)
+    if bool(payload.get("adm")) != bool(user.is_admin):
+        raise credentials_exception() # Role changed since login
+    return Principal(id=user.id, email=payload["sub"], is_admin=bool(payload.get("adm")))
+
+class UserCache:
+    \"\"\"Short-lived per-worker copies of user rows (detached from any session).\"\"\"
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._users: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+            return user
+
+    def put(self, user):
+        with self._lock:
+            self._users[user.id] = (time.monotonic() + self.ttl, user)
+            self._users.move_to_end(user.id)
+            while len(self._users) > self.max_entries:
+                self._users.popitem(last=False)
+
+    def forget(self, user_id: int):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+user_cache = UserCache(AUTH_USER_CACHE_TTL, AUTH_USER_CACHE_SIZE)
+"""
+
+SYNC_CURRENT_USER = """
+def load_user(db: Session, user_id: int):
+    user = user_cache.get(user_id)
+    if user is None:
+        user = db.get(models.User, user_id)
+        if user is not None:
+            db.expunge(user) # Shared across requests, so it must not belong to this session
+            user_cache.put(user)
+    return user
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+    payload = decode_token(token)
+    if AUTH_STATELESS and "uid" in payload:
+        return principal_from(payload, load_user(db, payload["uid"]))
+    user = db.query(models.User).filter(models.User.email == payload["sub"]).first()
+    check_token(payload, user)
+    return user
+
+def get_user_record(user = Depends(get_current_user), db: Session = Depends(database.get_db)):
+    \"\"\"The full User row, for endpoints that need more than the token claims.\"\"\"
+    return load_user(db, user.id) if isinstance(user, Principal) else user
+"""
+
+ASYNC_CURRENT_USER = """
+async def load_user(db: AsyncSession, user_id: int):
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await db.get(models.User, user_id)
+        if user is not None:
+            db.expunge(user) # Shared across requests, so it must not belong to this session
+            user_cache.put(user)
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_db)):
+    payload = decode_token(token)
+    if AUTH_STATELESS and "uid" in payload:
+        return principal_from(payload, await load_user(db, payload["uid"]))
+    result = await db.execute(select(models.User).where(models.User.email == payload["sub"]))
+    user = result.scalar_one_or_none()
+    check_token(payload, user)
+    return user
+
+async def get_user_record(user = Depends(get_current_user), db: AsyncSession = Depends(database.get_db)):
+    \"\"\"The full User row, for endpoints that need more than the token claims.\"\"\"
+    return await load_user(db, user.id) if isinstance(user, Principal) else user
+"""
+
+AUTH_ADMIN = """
+async def get_current_admin(user = Depends(get_current_user)):
+    if not user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return user
+"""
+
+def generate_auth_file(settings: AuthSettings, async_mode: bool = False) -> str:
+    if async_mode:
+        parts = [AUTH_IMPORTS, ASYNC_AUTH_IMPORTS, AUTH_SETTINGS, ASYNC_HASHING, AUTH_TOKENS, ASYNC_CURRENT_USER, AUTH_ADMIN]
+    else:
+        parts = [AUTH_IMPORTS, SYNC_AUTH_IMPORTS, AUTH_SETTINGS, AUTH_TOKENS, SYNC_CURRENT_USER, AUTH_ADMIN]
+    return (
+        "".join(parts)
+        .replace("__STATELESS__", "1" if settings.stateless else "0")
+        .replace("__USER_CACHE_TTL__", str(settings.user_cache_ttl_seconds))
+    )
+
+def generate_auth_router(async_mode: bool = False) -> str:
+    if async_mode:
+        return ASYNC_AUTH_ROUTER
     return """
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
@@ -30,10 +236,76 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
     
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=auth.token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/revoke")
+def revoke_tokens(user = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    # Signs out everywhere; other workers notice within AUTH_USER_CACHE_TTL
+    db_user = db.get(models.User, user.id)
+    db_user.token_version += 1
+    db.commit()
+    auth.user_cache.forget(user.id)
+    return {"detail": "Tokens revoked"}
+"""
+
+ASYNC_AUTH_ROUTER = """
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import timedelta
+from .. import database, models, schemas, auth
+
+router = APIRouter(prefix="/auth", tags=["Authentication"])
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalar_one_or_none()
+
+@router.post("/register", response_model=schemas.UserResponse)
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_db)):
+    db_user = await get_user_by_email(db, user.email)
+    if db_user:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    
+    hashed_password = await auth.get_password_hash_async(user.password)
+    new_user = models.User(email=user.email, hashed_password=hashed_password)
+    db.add(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    return new_user
+
+@router.post("/token", response_model=schemas.Token)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_db)):
+    user = await get_user_by_email(db, form_data.username)
+    if not user or not await auth.verify_password_async(form_data.password, user.hashed_password):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    
+    access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = auth.create_access_token(
+        data=auth.token_claims(user), expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/revoke")
+async def revoke_tokens(user = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_db)):
+    # Signs out everywhere; other workers notice within AUTH_USER_CACHE_TTL
+    db_user = await db.get(models.User, user.id)
+    db_user.token_version += 1
+    await db.commit()
+    auth.user_cache.forget(user.id)
+    return {"detail": "Tokens revoked"}
 """
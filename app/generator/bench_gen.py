@@ -0,0 +1,403 @@
+from typing import List, Optional
+from ..schemas import ProjectSchema
+from .engine import api_config_for
+from .seed_gen import seed_order
+
+BENCH_PY = '''"""HTTP load test for this API, built from the same schema as its routers.
+
+    python bench/loadtest.py --url http://127.0.0.1:8000 --concurrency 32 --duration 30
+    python bench/loadtest.py --mix list=10,read=70,update=20 --models Post,Comment
+    python bench/loadtest.py --save-baseline bench/baseline.json   # record a reference run
+    python bench/loadtest.py --baseline bench/baseline.json        # compare; exits 1 on a regression
+
+Keep-alive HTTP/1.1 over asyncio streams: nothing to install beyond the standard library.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import ssl
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+# Per model (parents first): route prefix, columns to send, foreign keys and access per operation
+MODELS = __MODELS__
+
+OPERATIONS = ["list", "read", "create", "update", "delete"]
+ACCESS = {"list": "read", "read": "read", "create": "create", "update": "update", "delete": "delete"}
+DEFAULT_MIX = "list=20,read=45,create=15,update=15,delete=5"
+RUN = uuid.uuid4().hex[:8]
+UNIQUE_BASE = random.randrange(1 << 30) # Unique int columns stay unique across runs
+MIN_POOL = 20 # Rows per model kept around so reads, updates and deletes always have targets
+
+class HTTPConnection:
+    """One keep-alive HTTP/1.1 connection; reconnects on the next request after a failure."""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.host_header = parts.netloc
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body=None, headers: Optional[Dict[str, str]] = None, form: bool = False) -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+        if body is None:
+            payload = b""
+        elif form:
+            payload = urlencode(body).encode()
+        else:
+            payload = json.dumps(body).encode()
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host_header}", f"Content-Length: {len(payload)}"]
+        if body is not None:
+            lines.append("Content-Type: " + ("application/x-www-form-urlencoded" if form else "application/json"))
+        lines.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+        try:
+            self.writer.write(("\\r\\n".join(lines) + "\\r\\n\\r\\n").encode() + payload)
+            return await self._read_response(method)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            await self.close()
+            raise
+
+    async def _read_response(self, method: str) -> Tuple[int, bytes]:
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Server closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\\r\\n", b"\\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if method == "HEAD" or status in (204, 304) or status < 200:
+            body = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self._read_chunked()
+        elif "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await self.reader.read() # Delimited by the server closing the connection
+            headers["connection"] = "close"
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, body
+
+    async def _read_chunked(self) -> bytes:
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                while await self.reader.readline() not in (b"\\r\\n", b"\\n", b""):
+                    pass # Trailers
+                return b"".join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.reader = self.writer = None
+
+def percentile(samples: List[float], q: float) -> float:
+    \"\"\"Nearest-rank percentile of already sorted samples.\"\"\"
+    if not samples:
+        return 0.0
+    return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+class Stats:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.recording = True
+
+    def record(self, route: str, seconds: float, ok: bool):
+        if not self.recording:
+            return
+        self.samples.setdefault(route, []).append(seconds)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        routes = {}
+        everything: List[float] = []
+        for route, samples in sorted(self.samples.items()):
+            samples.sort()
+            everything.extend(samples)
+            routes[route] = self._row(samples, self.errors.get(route, 0), elapsed)
+        everything.sort()
+        routes["TOTAL"] = self._row(everything, sum(self.errors.values()), elapsed)
+        return routes
+
+    @staticmethod
+    def _row(samples: List[float], errors: int, elapsed: float) -> dict:
+        return {
+            "requests": len(samples),
+            "errors": errors,
+            "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        }
+
+class LoadTest:
+    def __init__(self, url: str, token: str, models: List[str], mix: Dict[str, int], stats: Stats):
+        self.url = url
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.models = models
+        self.stats = stats
+        self.ids: Dict[str, List[int]] = {model_name: [] for model_name in MODELS}
+        self.created: Dict[str, List[int]] = {model_name: [] for model_name in MODELS} # Only these get deleted
+        self.counter = 0
+        self.choices = [
+            (model_name, operation)
+            for model_name in models for operation in OPERATIONS
+            if mix.get(operation) and MODELS[model_name]["access"].get(ACCESS[operation], "public") != "off"
+        ]
+        self.weights = [mix[operation] for _, operation in self.choices]
+
+    def payload(self, model_name: str) -> dict:
+        self.counter += 1
+        n = self.counter
+        spec = MODELS[model_name]
+        body = {}
+        for field_name, kind in spec["fields"].items():
+            unique = field_name in spec["unique"]
+            if kind == "int":
+                body[field_name] = UNIQUE_BASE + n if unique else n % 1000
+            elif kind == "float":
+                body[field_name] = n / 7
+            elif kind == "boolean":
+                body[field_name] = n % 2 == 0
+            elif kind == "datetime":
+                body[field_name] = datetime.utcnow().isoformat()
+            elif kind == "text":
+                body[field_name] = f"bench {RUN} {n} " + "lorem ipsum dolor sit amet " * 20
+            else:
+                body[field_name] = f"bench-{RUN}-{n}"
+        for field_name, parent in spec["relations"].items():
+            if self.ids.get(parent):
+                body[field_name] = random.choice(self.ids[parent])
+        return body
+
+    async def call(self, conn: HTTPConnection, route: str, method: str, path: str, body=None) -> Tuple[int, Optional[dict]]:
+        began = time.perf_counter()
+        try:
+            status, raw = await conn.request(method, path, body, self.headers)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            self.stats.record(route, time.perf_counter() - began, False)
+            return 0, None
+        self.stats.record(route, time.perf_counter() - began, status < 400)
+        try:
+            return status, json.loads(raw) if raw else None
+        except ValueError:
+            return status, None
+
+    async def run_operation(self, conn: HTTPConnection, model_name: str, operation: str):
+        spec = MODELS[model_name]
+        prefix = spec["path"]
+        ids = self.ids[model_name]
+        can_create = spec["access"].get("create", "public") != "off"
+        if operation in ("read", "update") and not ids:
+            operation = "create" if can_create else "list"
+        if operation == "delete" and (not self.created[model_name] or len(ids) <= MIN_POOL):
+            operation = "create" if can_create else "list" # Keep enough rows around for the other operations
+
+        if operation == "list":
+            await self.call(conn, f"GET {prefix}/", "GET", f"{prefix}/?limit=20")
+        elif operation == "read":
+            await self.call(conn, f"GET {prefix}/{{id}}", "GET", f"{prefix}/{random.choice(ids)}")
+        elif operation == "create":
+            status, data = await self.call(conn, f"POST {prefix}/", "POST", f"{prefix}/", self.payload(model_name))
+            if status == 200 and isinstance(data, dict):
+                ids.append(data["id"])
+                self.created[model_name].append(data["id"])
+        elif operation == "update":
+            await self.call(conn, f"PUT {prefix}/{{id}}", "PUT", f"{prefix}/{random.choice(ids)}", self.payload(model_name))
+        elif operation == "delete":
+            created = self.created[model_name]
+            item_id = created.pop(random.randrange(len(created)))
+            ids.remove(item_id)
+            await self.call(conn, f"DELETE {prefix}/{{id}}", "DELETE", f"{prefix}/{item_id}")
+
+    async def prepare(self):
+        \"\"\"Collect existing ids and create a few rows per model, parents first, so every route has targets.\"\"\"
+        conn = HTTPConnection(self.url)
+        self.stats.recording = False
+        try:
+            for model_name in MODELS:
+                spec = MODELS[model_name]
+                if spec["access"].get("read", "public") != "off":
+                    status, data = await self.call(conn, "", "GET", f"{spec['path']}/?limit={MIN_POOL * 5}")
+                    if status == 200 and isinstance(data, list):
+                        self.ids[model_name].extend(item["id"] for item in data)
+                if spec["access"].get("create", "public") != "off":
+                    while len(self.ids[model_name]) < MIN_POOL:
+                        status, data = await self.call(conn, "", "POST", f"{spec['path']}/", self.payload(model_name))
+                        if status != 200:
+                            print(f"Cannot create {model_name} rows (HTTP {status}): {data}", file=sys.stderr)
+                            break
+                        self.ids[model_name].append(data["id"])
+        finally:
+            self.stats.recording = True
+            await conn.close()
+
+    async def worker(self, deadline: float):
+        conn = HTTPConnection(self.url)
+        try:
+            while time.perf_counter() < deadline:
+                model_name, operation = random.choices(self.choices, self.weights)[0]
+                await self.run_operation(conn, model_name, operation)
+        finally:
+            await conn.close()
+
+async def login(url: str, email: str, password: str) -> str:
+    \"\"\"Token for the given account; falls back to registering a throwaway user.\"\"\"
+    conn = HTTPConnection(url)
+    try:
+        status, raw = await conn.request("POST", "/auth/token", {"username": email, "password": password}, form=True)
+        if status != 200:
+            print(f"Login as {email} failed (HTTP {status}); admin-only routes will fail. Registering a bench user.", file=sys.stderr)
+            email, password = f"bench-{RUN}@example.com", uuid.uuid4().hex
+            await conn.request("POST", "/auth/register", {"email": email, "password": password})
+            status, raw = await conn.request("POST", "/auth/token", {"username": email, "password": password}, form=True)
+            if status != 200:
+                raise SystemExit(f"Cannot log in at {url}/auth/token (HTTP {status}): {raw[:200]!r}")
+        return json.loads(raw)["access_token"]
+    finally:
+        await conn.close()
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in filter(None, text.split(",")):
+        operation, _, weight = part.partition("=")
+        if operation not in OPERATIONS or not weight.isdigit():
+            raise SystemExit(f"--mix expects op=weight pairs with op one of: {', '.join(OPERATIONS)}")
+        mix[operation] = int(weight)
+    return mix
+
+def print_table(routes: Dict[str, dict]):
+    print(f"{'route':<40} {'reqs':>8} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, row in routes.items():
+        print(f"{route:<40} {row['requests']:>8} {row['errors']:>7} {row['rps']:>9.1f} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+
+def compare(routes: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> bool:
+    \"\"\"Print p95 and req/s against the baseline; True when any route regressed beyond the tolerance.\"\"\"
+    regressed = False
+    print(f"\\n{'route':<40} {'p95 ms':>19} {'req/s':>21}")
+    for route, row in routes.items():
+        base = baseline.get(route)
+        if not base or not base["requests"]:
+            continue
+        slower = base["p95_ms"] and row["p95_ms"] > base["p95_ms"] * (1 + tolerance)
+        fewer = row["rps"] < base["rps"] * (1 - tolerance)
+        flag = "  REGRESSION" if slower or fewer else ""
+        regressed = regressed or bool(flag)
+        p95_change = (row["p95_ms"] / base["p95_ms"] - 1) * 100 if base["p95_ms"] else 0.0
+        rps_change = (row["rps"] / base["rps"] - 1) * 100 if base["rps"] else 0.0
+        print(f"{route:<40} {row['p95_ms']:>9.2f} ({p95_change:+6.1f}%) {row['rps']:>9.1f} ({rps_change:+6.1f}%){flag}")
+    return regressed
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the generated API.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent connections")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds of unrecorded traffic first")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"operation weights (default {DEFAULT_MIX})")
+    parser.add_argument("--models", help="comma separated models to exercise (default: all)")
+    parser.add_argument("--email", default="admin@example.com", help="account to log in with (seed.py creates this admin)")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--seed", type=int, help="random seed for a reproducible request sequence")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write the results as the new baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed p95/req/s change before flagging (default 0.10)")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    models = [name.strip() for name in args.models.split(",")] if args.models else list(MODELS)
+    unknown = [name for name in models if name not in MODELS]
+    if unknown:
+        raise SystemExit(f"Unknown models {', '.join(unknown)} (available: {', '.join(MODELS)})")
+
+    stats = Stats()
+    test = LoadTest(args.url, await login(args.url, args.email, args.password), models, parse_mix(args.mix), stats)
+    if not test.choices:
+        raise SystemExit("No enabled routes match --models and --mix")
+    await test.prepare()
+
+    if args.warmup > 0:
+        stats.recording = False
+        await asyncio.gather(*[test.worker(time.perf_counter() + args.warmup) for _ in range(args.concurrency)])
+        stats.recording = True
+    began = time.perf_counter()
+    await asyncio.gather(*[test.worker(began + args.duration) for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - began
+
+    routes = stats.summary(elapsed)
+    print_table(routes)
+    result = {
+        "meta": {
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "duration": round(elapsed, 3),
+            "mix": args.mix,
+            "models": models,
+            "started": datetime.utcnow().isoformat(),
+        },
+        "routes": routes,
+    }
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["routes"]
+        if compare(routes, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
+'''
+
+def bench_models(project_schema: ProjectSchema, order: Optional[List[str]] = None) -> List[str]:
+    # The User router is tied to the auth module (passwords), so it is not load tested
+    # order: seed_order() of the models, parents first, when the caller already computed it
+    lines = ["{"]
+    for model_name in order if order is not None else seed_order(project_schema.models):
+        model_def = project_schema.models.get(model_name)
+        if model_def is None or model_name == "User":
+            continue
+        access = api_config_for(project_schema, model_name)
+        if all(access.get(action, "public") == "off" for action in ["create", "read", "update", "delete"]):
+            continue
+        relations = dict(model_def.relations or {})
+        fields = {name: field.type.lower() for name, field in model_def.fields.items() if name != "id" and name not in relations}
+        unique = [name for name, field in model_def.fields.items() if field.unique]
+        lines.append(f"    {model_name!r}: {{")
+        lines.append(f"        'path': '/{model_name.lower()}s',")
+        lines.append(f"        'fields': {fields!r},")
+        lines.append(f"        'unique': {unique!r},")
+        lines.append(f"        'relations': {relations!r},")
+        lines.append(f"        'access': {dict(access)!r},")
+        lines.append("    },")
+    lines.append("}")
+    return lines
+
+def generate_bench_file(project_schema: ProjectSchema, order: Optional[List[str]] = None) -> str:
+    return BENCH_PY.replace("__MODELS__", "\n".join(bench_models(project_schema, order)))
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
+from ..schemas import ProjectSchema
+
+def _generator_version() -> str:
+    # Hash of the generator sources: any change to the templates invalidates cached archives
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".py"):
+            digest.update(filename.encode())
+            with open(os.path.join(directory, filename), "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+GENERATOR_VERSION = _generator_version()
+
+def schema_fingerprint(project_schema: ProjectSchema) -> str:
+    """Stable content hash of a schema (key order independent) plus the generator version."""
+    canonical = json.dumps(project_schema.dict(), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{GENERATOR_VERSION}:{canonical}".encode()).hexdigest()
+
+class ZipCache:
+    """Size-bounded in-memory LRU of generated archives, with an optional directory tier."""
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None, disk_max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "ZipCache":
+        return cls(
+            max_bytes=int(os.environ.get("BUILDER_ZIP_CACHE_MB", "64")) * 1024 * 1024,
+            disk_dir=os.environ.get("BUILDER_ZIP_CACHE_DIR") or None,
+            disk_max_bytes=int(os.environ.get("BUILDER_ZIP_CACHE_DISK_MB", "512")) * 1024 * 1024,
+        )
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.zip")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path) # mtime doubles as the disk tier's LRU clock
+            except FileNotFoundError:
+                return None
+            self._remember(key, data)
+            return data
+        return None
+
+    def put(self, key: str, data: bytes):
+        self._remember(key, data)
+        if self.disk_dir:
+            self._write_disk(key, data)
+
+    def stream_through(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Pass chunks on unchanged and cache the whole archive once the stream completes.
+
+        At most `max_bytes` of the archive is held in memory for the memory tier; with a
+        disk tier the chunks are also spooled to a temp file in `disk_dir` as they pass.
+        Each copy is dropped as soon as the archive outgrows its tier.
+        """
+        collected: Optional[list] = []
+        size = 0
+        spool = None
+        if self.disk_dir and self.disk_max_bytes > 0:
+            fd, spool_path = tempfile.mkstemp(dir=self.disk_dir, prefix=".tmp-")
+            spool = os.fdopen(fd, "wb")
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                if collected is not None:
+                    if size > self.max_bytes:
+                        collected = None
+                    else:
+                        collected.append(chunk)
+                if spool is not None:
+                    if size > self.disk_max_bytes:
+                        spool.close()
+                        os.remove(spool_path)
+                        spool = None
+                    else:
+                        spool.write(chunk)
+                yield chunk
+            if collected is not None:
+                self._remember(key, b"".join(collected))
+            if spool is not None:
+                spool.close()
+                spool = None
+                self._store_disk_file(key, spool_path)
+        finally:
+            if spool is not None: # Stream abandoned or failed midway
+                spool.close()
+                os.remove(spool_path)
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _write_disk(self, key: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        self._store_disk_file(key, tmp_path)
+
+    def _store_disk_file(self, key: str, tmp_path: str):
+        """Move a finished archive from `tmp_path` into the disk tier, then trim it to size."""
+        os.replace(tmp_path, self._disk_path(key))
+
+        files = []
+        for filename in os.listdir(self.disk_dir):
+            if filename.endswith(".zip"):
+                try:
+                    st = os.stat(os.path.join(self.disk_dir, filename))
+                except FileNotFoundError:
+                    continue # Evicted by another worker since the listing
+                files.append((st.st_mtime, st.st_size, filename))
+        total = sum(size for _, size, _ in files)
+        for _, size, filename in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.disk_dir, filename))
+            except FileNotFoundError:
+                pass # Already gone: it no longer counts either way
+            total -= size
+
+zip_cache = ZipCache.from_env()
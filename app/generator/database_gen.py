@@ -0,0 +1,158 @@
+DATABASE_IMPORTS = """
+import os
+import threading
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+"""
+
+SYNC_IMPORTS = """from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, declarative_base
+"""
+
+ASYNC_IMPORTS = """from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+"""
+
+DATABASE_SETTINGS = """
+# Connection settings (all overridable through the environment)
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./app.db")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+
+def engine_options(url) -> dict:
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    if url.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            return options # In-memory databases live in a single connection
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+    )
+    return options
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the writer; busy_timeout makes concurrent
+    # writers wait for the lock instead of failing with "database is locked"
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+class PoolMetrics:
+    \"\"\"Connection pool counters, fed by pool events.\"\"\"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.engine = None
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+
+    def install(self, engine):
+        self.engine = engine
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+            }
+        pool = self.engine.pool if self.engine is not None else None
+        if hasattr(pool, "size"): # QueuePool: configured limits
+            stats.update(
+                pool_size=pool.size(),
+                max_overflow=DB_MAX_OVERFLOW,
+                overflow=pool.overflow(),
+                idle=pool.checkedin(),
+            )
+        return stats
+
+pool_metrics = PoolMetrics()
+"""
+
+SYNC_ENGINE = """
+def create_db_engine(database_url: str = SQLALCHEMY_DATABASE_URL):
+    url = make_url(database_url)
+    engine = create_engine(url, **engine_options(url))
+    if url.get_backend_name() == "sqlite":
+        event.listen(engine, "connect", set_sqlite_pragmas)
+    pool_metrics.install(engine)
+    return engine
+
+engine = create_db_engine()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+"""
+
+ASYNC_ENGINE = """
+# Plain URLs (e.g. from docker-compose) get the matching async driver
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgres": "postgresql+asyncpg", "postgresql": "postgresql+asyncpg"}
+
+def create_db_engine(database_url: str = SQLALCHEMY_DATABASE_URL):
+    scheme, sep, rest = database_url.partition("://")
+    url = make_url(ASYNC_DRIVERS.get(scheme, scheme) + sep + rest)
+    engine = create_async_engine(url, **engine_options(url))
+    # Pool and connect events live on the sync core of the async engine
+    if url.get_backend_name() == "sqlite":
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    pool_metrics.install(engine.sync_engine)
+    return engine
+
+engine = create_db_engine()
+# expire_on_commit=False: returned objects stay readable after commit without lazy IO
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
+"""
+
+def generate_database_file(async_mode: bool = False) -> str:
+    if async_mode:
+        return DATABASE_IMPORTS + ASYNC_IMPORTS + DATABASE_SETTINGS + ASYNC_ENGINE
+    return DATABASE_IMPORTS + SYNC_IMPORTS + DATABASE_SETTINGS + SYNC_ENGINE
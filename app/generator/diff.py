@@ -0,0 +1,63 @@
+import difflib
+import json
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+from ..schemas import ProjectSchema
+from .main_gen import iter_project_files, iter_zip
+from ..telemetry import timed
+
+MANIFEST_PATH = ".builder-diff.json"
+
+class ProjectDiff(NamedTuple):
+    changed: Dict[str, str] # path -> new content, for added and modified files
+    added: List[str]
+    modified: List[str]
+    deleted: List[str]
+    old_files: Dict[str, str]
+
+@timed("generate.diff")
+def diff_project_files(old_schema: ProjectSchema, new_schema: ProjectSchema) -> ProjectDiff:
+    """Compare the generated output of two schemas file by file.
+
+    Unchanged models come out of the section cache, so regenerating the old
+    side mostly costs a join.
+    """
+    old_files = dict(iter_project_files(old_schema))
+    new_files = dict(iter_project_files(new_schema))
+
+    added = [path for path in new_files if path not in old_files]
+    modified = [path for path in new_files if path in old_files and new_files[path] != old_files[path]]
+    deleted = [path for path in old_files if path not in new_files]
+    changed = {path: new_files[path] for path in added + modified}
+    return ProjectDiff(changed, added, modified, deleted, old_files)
+
+def _manifest(diff: ProjectDiff, since: int, revision: int) -> str:
+    return json.dumps({
+        "since": since,
+        "revision": revision,
+        "added": diff.added,
+        "modified": diff.modified,
+        "deleted": diff.deleted,
+    }, indent=2)
+
+def iter_diff_zip(diff: ProjectDiff, since: int, revision: int) -> Iterator[bytes]:
+    """Archive holding only added/modified files, plus a manifest listing deletions."""
+    files: List[Tuple[str, str]] = [(MANIFEST_PATH, _manifest(diff, since, revision))]
+    files.extend(diff.changed.items())
+    return iter_zip(files)
+
+def unified_patch(diff: ProjectDiff) -> str:
+    """A `git apply`/`patch -p1` compatible diff of the generated files."""
+    chunks = []
+    for path in sorted(diff.added + diff.modified + diff.deleted):
+        old = diff.old_files.get(path)
+        new = diff.changed.get(path)
+        for line in difflib.unified_diff(
+            (old or "").splitlines(keepends=True),
+            (new or "").splitlines(keepends=True),
+            fromfile=f"a/{path}" if old is not None else "/dev/null",
+            tofile=f"b/{path}" if new is not None else "/dev/null",
+        ):
+            if not line.endswith("\n"):
+                line += "\n\\ No newline at end of file\n"
+            chunks.append(line)
+    return "".join(chunks)
@@ -0,0 +1,165 @@
+import atexit
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from ..schemas import ProjectSchema, ModelDefinition
+from .models_gen import generate_model_class, relation_attributes
+from .schemas_gen import generate_model_schemas
+from .admin_gen import generate_model_admin
+from .seed_gen import generate_model_seed
+from .router_gen import generate_router_file
+from .cache import GENERATOR_VERSION
+from ..telemetry import metrics
+
+# Per-model work is independent, so large schemas fan it out over a pool.
+# Results come back in model order (Executor.map), so the merged files are
+# byte-identical to a serial run. Routers, one file per model, are rendered
+# lazily a window at a time so a stream never holds all of them at once.
+GEN_WORKERS = int(os.environ.get("BUILDER_GEN_WORKERS", "0")) or (os.cpu_count() or 1)
+GEN_EXECUTOR = os.environ.get("BUILDER_GEN_EXECUTOR", "process") # "process", "thread" or "serial"
+PARALLEL_MIN_MODELS = int(os.environ.get("BUILDER_GEN_PARALLEL_MIN_MODELS", "64"))
+# Rendered sections are reused across generations while their inputs are unchanged
+SECTION_CACHE_SIZE = int(os.environ.get("BUILDER_GEN_SECTION_CACHE", "4096"))
+
+DEFAULT_API_CONFIG = {"create": "public", "read": "public", "update": "public", "delete": "public"}
+
+class ModelSections(NamedTuple):
+    """A model's pieces of the merged files (models.py, schemas.py, admin.py, seed.py)."""
+    model_class: List[str]
+    schemas: List[str]
+    admin: List[str]
+    seed: List[str]
+
+def api_config_for(project_schema: ProjectSchema, model_name: str) -> Dict[str, str]:
+    # Get API config for this model, default to all public/enabled if missing
+    return project_schema.apis.get(model_name, DEFAULT_API_CONFIG)
+
+# (model name, definition, api config, async mode, relations other models declare to it, response cache,
+#  read access level of every related model)
+ModelTask = Tuple[str, ModelDefinition, Dict[str, str], bool, List[Tuple[str, str, str]], bool, Dict[str, str]]
+
+def incoming_relations(project_schema: ProjectSchema) -> Dict[str, List[Tuple[str, str, str]]]:
+    """Target model -> [(collection name, child model, child foreign key)], from every model's relations."""
+    incoming: Dict[str, List[Tuple[str, str, str]]] = {}
+    for model_name, model_def in project_schema.models.items():
+        for fk, target, _, collection in relation_attributes(model_name, model_def):
+            incoming.setdefault(target, []).append((collection, model_name, fk))
+    return incoming
+
+def model_fingerprint(task: ModelTask) -> str:
+    """Hash of everything a model's sections are rendered from."""
+    model_name, model_def, api_config, async_mode, incoming, cache, read_levels = task
+    canonical = json.dumps([model_name, model_def.dict(), api_config, async_mode, incoming, cache, read_levels], sort_keys=True, default=str)
+    return hashlib.sha256(f"{GENERATOR_VERSION}:{canonical}".encode()).hexdigest()
+
+def render_model(task: ModelTask) -> ModelSections:
+    model_name, model_def, api_config, async_mode, incoming, cache, _ = task
+    return ModelSections(
+        model_class=generate_model_class(model_name, model_def),
+        schemas=generate_model_schemas(model_name, model_def, incoming),
+        admin=generate_model_admin(model_name, model_def),
+        seed=generate_model_seed(model_name, model_def),
+    )
+
+def render_router(task: ModelTask) -> str:
+    model_name, model_def, api_config, async_mode, incoming, cache, read_levels = task
+    return generate_router_file(model_name, model_def, api_config, async_mode, incoming, cache, read_levels)
+
+# (fingerprint, "sections" or "router") -> rendered output
+_section_cache: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+_section_cache_lock = threading.Lock()
+
+def _cached_sections(key: Tuple[str, str]) -> Optional[Any]:
+    with _section_cache_lock:
+        sections = _section_cache.get(key)
+        if sections is not None:
+            _section_cache.move_to_end(key)
+        return sections
+
+def _remember_sections(key: Tuple[str, str], sections: Any):
+    with _section_cache_lock:
+        _section_cache[key] = sections
+        _section_cache.move_to_end(key)
+        while len(_section_cache) > SECTION_CACHE_SIZE:
+            _section_cache.popitem(last=False)
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> Executor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if GEN_EXECUTOR == "thread":
+                _executor = ThreadPoolExecutor(max_workers=GEN_WORKERS, thread_name_prefix="codegen")
+            else:
+                # spawn: workers must not inherit the server's threads and locks
+                _executor = ProcessPoolExecutor(max_workers=GEN_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_executor.shutdown, wait=False)
+        return _executor
+
+def model_tasks(project_schema: ProjectSchema) -> List[Tuple[str, ModelTask]]:
+    """(fingerprint, task) for every model, in model order."""
+    async_mode = project_schema.database.mode == "async"
+    incoming = incoming_relations(project_schema)
+    cache = project_schema.cache.enabled
+    read_level = lambda name: api_config_for(project_schema, name).get("read", "public")
+    tasks = []
+    for model_name, model_def in project_schema.models.items():
+        related = [target for _, target, _, _ in relation_attributes(model_name, model_def)]
+        related += [child for _, child, _ in incoming.get(model_name, [])]
+        read_levels = {name: read_level(name) for name in related}
+        tasks.append((model_name, model_def, api_config_for(project_schema, model_name), async_mode, incoming.get(model_name, []), cache, read_levels))
+    return [(model_fingerprint(task), task) for task in tasks]
+
+def _render_windows(func: Callable[[ModelTask], Any], tasks: List[ModelTask]) -> Iterator[Any]:
+    """func(task) for every task, in order, rendered on the pool a window at a time.
+
+    The next window is submitted before the current one is handed out, so the
+    pool keeps working while the consumer catches up, and at most two windows
+    of results are held at once.
+    """
+    if GEN_EXECUTOR == "serial" or GEN_WORKERS < 2 or len(tasks) < PARALLEL_MIN_MODELS:
+        yield from map(func, tasks)
+        return
+    executor = _get_executor()
+    window = GEN_WORKERS * 16
+    # A few chunks per worker keeps pickling overhead low and the load balanced
+    chunksize = max(1, window // (GEN_WORKERS * 4))
+    in_flight: deque = deque()
+    for start in range(0, len(tasks), window):
+        in_flight.append(executor.map(func, tasks[start:start + window], chunksize=chunksize))
+        if len(in_flight) > 1:
+            yield from in_flight.popleft()
+    while in_flight:
+        yield from in_flight.popleft()
+
+def _render_cached(func: Callable[[ModelTask], Any], kind: str, tasks: List[Tuple[str, ModelTask]]) -> Iterator[Any]:
+    """func(task) for every task, in order; outputs rendered before are taken from the section cache."""
+    cached = [_cached_sections((fingerprint, kind)) for fingerprint, _ in tasks]
+    missing = [i for i, output in enumerate(cached) if output is None]
+    metrics.inc("section_cache", "hit", len(tasks) - len(missing))
+    metrics.inc("section_cache", "miss", len(missing))
+    rendered = _render_windows(func, [tasks[i][1] for i in missing])
+    for (fingerprint, _), output in zip(tasks, cached):
+        if output is None:
+            output = next(rendered)
+            _remember_sections((fingerprint, kind), output)
+        yield output
+
+def render_model_sections(project_schema: ProjectSchema, tasks: Optional[List[Tuple[str, ModelTask]]] = None) -> List[ModelSections]:
+    """Render every model's pieces of the merged files, in model order.
+
+    Models whose fingerprint was rendered before are taken from the section
+    cache; only the rest is rendered, in parallel when there are enough of them.
+    """
+    return list(_render_cached(render_model, "sections", tasks if tasks is not None else model_tasks(project_schema)))
+
+def iter_model_routers(project_schema: ProjectSchema, tasks: Optional[List[Tuple[str, ModelTask]]] = None) -> Iterator[str]:
+    """Yield every model's router file, in model order, rendering only as far ahead as the pool's window."""
+    return _render_cached(render_router, "router", tasks if tasks is not None else model_tasks(project_schema))
@@ -1,90 +1,190 @@
 import os
-import io
 import zipfile
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Iterator, List, Tuple
 from ..schemas import ProjectSchema, ModelDefinition
 from .models_gen import generate_models_file
 from .schemas_gen import generate_schemas_file
-from .router_gen import generate_router_file
+from .engine import iter_model_routers, model_tasks, render_model_sections
+from .database_gen import generate_database_file
+from .response_cache_gen import generate_response_cache_file
+from .auth_gen import generate_auth_file, generate_auth_router
+from .observability_gen import generate_observability_file
+from ..telemetry import span
 
 # Boilerplate Content
-DATABASE_PY = """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+PAGINATION_PY = """
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Keyset pagination: a page is "rows after the last one seen" in (sort, id) order,
+# so it is an index range scan however deep the client pages.
 
-def get_db():
-    db = SessionLocal()
+def encode_cursor(sort: str, value: Any, item_id: int) -> str:
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, item_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort: str, column) -> Tuple[Any, int]:
     try:
-        yield db
-    finally:
-        db.close()
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, item_id = json.loads(raw)
+        if cursor_sort != sort:
+            raise ValueError("sort mismatch")
+        if isinstance(value, str) and column.type.python_type in (datetime, date):
+            value = column.type.python_type.fromisoformat(value)
+        return value, int(item_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor for this sort order")
+
+def keyset_page(stmt, model, sort_fields: Dict[str, Any], sort: str, cursor: Optional[str], limit: int):
+    \"\"\"Order `stmt` by `sort` (prefix "-" for descending), resume after `cursor`, fetch limit + 1 rows.\"\"\"
+    descending = sort.startswith("-")
+    key = sort.lstrip("-")
+    if key not in sort_fields:
+        raise HTTPException(status_code=400, detail=f"Cannot sort by '{key}', choose one of: {', '.join(sort_fields)}")
+    column = sort_fields[key]
+
+    def after(col, value):
+        return col < value if descending else col > value
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort, column)
+        if key == "id":
+            stmt = stmt.where(after(model.id, last_id))
+        else:
+            stmt = stmt.where(or_(after(column, value), and_(column == value, after(model.id, last_id))))
+
+    order = [column.desc() if descending else column.asc()]
+    if key != "id":
+        order.append(model.id.desc() if descending else model.id.asc()) # Tie-breaker keeps the order total
+    return stmt.order_by(*order).limit(limit + 1)
+
+def finish_page(items: List[Any], sort: str, limit: int, response: Response) -> List[Any]:
+    \"\"\"Trim the look-ahead row; if there was one, hand out the cursor for the next page.\"\"\"
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(sort, getattr(last, sort.lstrip("-")), last.id)
+    return items
+"""
+
+BULK_PY = """
+import os
+from typing import Any, Dict, Iterable, List, Set, Tuple
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+MAX_BULK_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", "1000"))
+
+# (index in the request, column values) for every item that passed validation
+Rows = List[Tuple[int, Dict[str, Any]]]
+
+def check_batch_size(items: list):
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} items per request")
+
+def validate_items(items: List[Dict[str, Any]], schema, partial: bool = False) -> Tuple[Rows, List[dict]]:
+    rows, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            rows.append((index, schema(**item).dict(exclude_unset=partial)))
+        except ValidationError as e:
+            errors.append({"index": index, "detail": [{"loc": err["loc"], "msg": err["msg"]} for err in e.errors()]})
+    return rows, errors
+
+def split_missing(rows: Rows, existing_ids: Set[int], detail: str) -> Tuple[Rows, List[dict]]:
+    found = [(index, row) for index, row in rows if row["id"] in existing_ids]
+    missing = [{"index": index, "detail": detail} for index, row in rows if row["id"] not in existing_ids]
+    return found, missing
+
+def bulk_result(results: Iterable[Tuple[int, int]], errors: List[dict]) -> dict:
+    return {
+        "results": [{"index": index, "id": item_id} for index, item_id in results],
+        "errors": sorted(errors, key=lambda error: error["index"]),
+    }
 """
 
-AUTH_PY = """
-from datetime import datetime, timedelta
-from typing import Optional
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from . import database, models, schemas
-
-# SECURITY CONFIG
-SECRET_KEY = "CHANGE_THIS_TO_A_REAL_SECRET_KEY"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+INCLUDES_PY = """
+from typing import Any, Dict, List, NamedTuple, Optional
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import load_only
+
+class Include(NamedTuple):
+    loader: Any # joinedload or selectinload
+    schema: Any # Response model of the related rows
+    many: bool
+    model: str # Related model name
+
+def parse_includes(include: Optional[str], includes: Dict[str, Include]) -> List[str]:
+    \"\"\"Validate ?include=a,b against the relations a router can embed.\"\"\"
+    if not include:
+        return []
+    names = list(dict.fromkeys(name.strip() for name in include.split(",") if name.strip()))
+    unknown = [name for name in names if name not in includes]
+    if unknown:
+        available = ", ".join(includes) or "none"
+        raise HTTPException(status_code=400, detail=f"Cannot include {', '.join(unknown)} (available: {available})")
+    return names
+
+def include_options(model, includes: Dict[str, Include], names: List[str]) -> list:
+    # Looked up per request: backref collections only exist once the mappers are configured
+    return [includes[name].loader(getattr(model, name)) for name in names]
+
+def parse_fields(fields: Optional[str], columns: List[str]) -> Optional[List[str]]:
+    \"\"\"Validate ?fields=a,b against a model's columns; None means every column.\"\"\"
+    if not fields:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields {', '.join(unknown)} (available: {', '.join(columns)})")
+    return ["id"] + [name for name in names if name != "id"]
+
+def field_options(model, fields: Optional[List[str]], *extra: str) -> list:
+    # extra: columns the handler reads itself (e.g. the sort key for the next cursor)
+    if fields is None:
+        return []
+    columns = [getattr(model, name, None) for name in dict.fromkeys([*fields, *extra])]
+    return [load_only(*[column for column in columns if column is not None])]
+
+def serialize(item, schema, includes: Dict[str, Include], names: List[str], fields: Optional[List[str]] = None) -> dict:
+    \"\"\"Columns plus the requested relations only; other relations are never touched, so never lazy loaded.\"\"\"
+    if fields is None:
+        data = schema.model_validate(item).model_dump()
     else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-        
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if user is None:
-        raise credentials_exception
-    return user
+        # Unloaded columns must not be touched either
+        data = {name: getattr(item, name) for name in fields}
+    for name in names:
+        spec = includes[name]
+        value = getattr(item, name)
+        if spec.many:
+            data[name] = [spec.schema.model_validate(child).model_dump() for child in value]
+        else:
+            data[name] = spec.schema.model_validate(value).model_dump() if value is not None else None
+    return data
+
+def sparse_response(content: Any, fields: Optional[List[str]], response: Optional[Response] = None) -> Any:
+    \"\"\"Full rows go through the endpoint's response_model; sparse ones are encoded as they are.\"\"\"
+    if fields is None:
+        return content
+    headers = dict(response.headers) if response is not None else None # e.g. X-Next-Cursor
+    return JSONResponse(jsonable_encoder(content), headers=headers)
 """
 
 REQUIREMENTS_TXT = """
 fastapi
 uvicorn
-sqlalchemy
+sqlalchemy>=2.0
 pydantic
 python-multipart
 passlib[bcrypt]
@@ -93,6 +193,9 @@ sqladmin
 Faker
 """
 
+# Async mode: SQLAlchemy's asyncio extra plus the async drivers for SQLite and Postgres
+ASYNC_REQUIREMENTS_TXT = REQUIREMENTS_TXT.replace("\nsqlalchemy>=2.0\n", "\nsqlalchemy[asyncio]>=2.0\naiosqlite\nasyncpg\n")
+
 DOCKERFILE = """
 FROM python:3.9-slim
 
@@ -120,66 +223,126 @@ services:
       - DATABASE_URL=sqlite:///./app.db
 """
 
-def generate_project_zip(project_schema: ProjectSchema) -> bytes:
-    zip_buffer = io.BytesIO()
+# Fixed entry timestamp so the same schema always yields byte-identical archives
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+def _write(zip_file: zipfile.ZipFile, path: str, content: str):
+    info = zipfile.ZipInfo(path, date_time=ZIP_DATE_TIME)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    zip_file.writestr(info, content)
+
+def iter_project_files(project_schema: ProjectSchema) -> Iterator[Tuple[str, str]]:
+    """Yield (archive path, content) for every generated file, one at a time."""
+    # Per-model pieces of the merged files are rendered up front (in parallel for big
+    # schemas); each kind is released once its file is yielded. Routers are rendered
+    # lazily, in model order, when their turn comes.
+    tasks = model_tasks(project_schema)
+    with span("generate.sections"):
+        sections = render_model_sections(project_schema, tasks)
+    model_classes = [s.model_class for s in sections]
+    model_schemas = [s.schemas for s in sections]
+    model_admins = [s.admin for s in sections]
+    model_seeds = [s.seed for s in sections]
+    del sections
+
+    async_mode = project_schema.database.mode == "async"
+
+    # 1. Base files
+    # Stage spans close before each yield, so they never include the consumer's time
+    with span("generate.database_file"):
+        content = generate_database_file(async_mode)
+    yield "app/database.py", content
+    with span("generate.auth_file"):
+        content = generate_auth_file(project_schema.auth, async_mode)
+    yield "app/auth.py", content
+    requirements = ASYNC_REQUIREMENTS_TXT if async_mode else REQUIREMENTS_TXT
+    if project_schema.cache.enabled:
+        requirements += "redis\n" # Only imported with CACHE_BACKEND=redis
+    yield "requirements.txt", requirements
+    yield "app/pagination.py", PAGINATION_PY
+    yield "app/bulk.py", BULK_PY
+    yield "app/includes.py", INCLUDES_PY
+    if project_schema.cache.enabled:
+        with span("generate.response_cache_file"):
+            content = generate_response_cache_file(project_schema.cache)
+        yield "app/response_cache.py", content
+    if project_schema.observability.enabled:
+        with span("generate.observability_file"):
+            content = generate_observability_file(project_schema.observability)
+        yield "app/observability.py", content
+    yield "Dockerfile", DOCKERFILE
+    yield "docker-compose.yml", DOCKER_COMPOSE
+    yield "app/__init__.py", ""
     
-    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-        # 1. Base files
-        zip_file.writestr("app/database.py", DATABASE_PY)
-        zip_file.writestr("app/auth.py", AUTH_PY)
-        zip_file.writestr("requirements.txt", REQUIREMENTS_TXT)
-        zip_file.writestr("Dockerfile", DOCKERFILE)
-        zip_file.writestr("docker-compose.yml", DOCKER_COMPOSE)
-        zip_file.writestr("app/__init__.py", "")
-        
-        # 2. Models
-        models_code = generate_models_file(project_schema.models)
-        zip_file.writestr("app/models.py", models_code)
-        
-        # 3. Schemas (Pydantic)
-        schemas_code = generate_schemas_file(project_schema.models)
-        zip_file.writestr("app/schemas.py", schemas_code)
-        
-        # 4. Routers
-        router_imports = []
-        router_inclusions = []
-        
-        # Auth Router
-        from .auth_gen import generate_auth_router
-        zip_file.writestr("app/routers/auth.py", generate_auth_router())
-        router_imports.append("from .routers import auth")
-        router_inclusions.append("app.include_router(auth.router)")
-        
-        # Create routers package
-        zip_file.writestr("app/routers/__init__.py", "")
-        
-        for model_name, model_def in project_schema.models.items():
-            # Get API config for this model, default to all public/enabled if missing
-            api_config = project_schema.apis.get(model_name, {
-                "create": "public", "read": "public", "update": "public", "delete": "public"
-            })
-            
-            router_code = generate_router_file(model_name, model_def, api_config)
-            zip_file.writestr(f"app/routers/{model_name.lower()}.py", router_code)
-            
-            router_imports.append(f"from .routers import {model_name.lower()}")
-            router_inclusions.append(f"app.include_router({model_name.lower()}.router)")
-
-        # 5. Admin Panel
-        from .admin_gen import generate_admin_file
-        zip_file.writestr("app/admin.py", generate_admin_file(project_schema.models))
-
-        # 6. Main App
-        main_lines = [
-            "from fastapi import FastAPI",
-            "from sqladmin import Admin",
-            "from . import models, database, admin"
-        ]
-        
-        # Imports from routers
-        main_lines.append("from .routers import auth")
-        main_lines.extend(router_imports)
+    # 2. Models
+    with span("generate.models_file"):
+        models_code = generate_models_file(project_schema.models, model_classes)
+    del model_classes
+    yield "app/models.py", models_code
+    del models_code
+    
+    # 3. Schemas (Pydantic)
+    with span("generate.schemas_file"):
+        schemas_code = generate_schemas_file(project_schema.models, model_schemas)
+    del model_schemas
+    yield "app/schemas.py", schemas_code
+    del schemas_code
+    
+    # 4. Routers
+    router_imports = []
+    router_inclusions = []
+    
+    # Auth Router
+    yield "app/routers/auth.py", generate_auth_router(async_mode)
+    router_imports.append("from .routers import auth")
+    router_inclusions.append("app.include_router(auth.router)")
+    
+    # Create routers package
+    yield "app/routers/__init__.py", ""
+    
+    routers = iter_model_routers(project_schema, tasks)
+    for model_name in project_schema.models.keys():
+        with span("generate.router"):
+            router_code = next(routers)
+        yield f"app/routers/{model_name.lower()}.py", router_code
         
+        router_imports.append(f"from .routers import {model_name.lower()}")
+        router_inclusions.append(f"app.include_router({model_name.lower()}.router)")
+
+    # 5. Admin Panel
+    from .admin_gen import generate_admin_file
+    with span("generate.admin_file"):
+        content = generate_admin_file(project_schema.models, model_admins)
+    del model_admins
+    yield "app/admin.py", content
+
+    # 6. Main App
+    main_lines = [
+        "from fastapi import FastAPI, Response" if project_schema.observability.enabled else "from fastapi import FastAPI",
+        "from sqladmin import Admin",
+        "from . import models, database, admin"
+    ]
+    if project_schema.observability.enabled:
+        main_lines.append("from . import observability")
+    
+    # Imports from routers
+    main_lines.append("from .routers import auth")
+    main_lines.extend(router_imports)
+    
+    if async_mode:
+        # create_all is sync-only: run it through the async engine once at startup
+        main_lines.extend([
+            "",
+            "app = FastAPI(title='Generated App')",
+            "",
+            "@app.on_event('startup')",
+            "async def create_tables():",
+            "    async with database.engine.begin() as conn:",
+            "        await conn.run_sync(models.Base.metadata.create_all)",
+            ""
+        ])
+    else:
         main_lines.extend([
             "",
             "models.Base.metadata.create_all(bind=database.engine)",
@@ -187,41 +350,112 @@ def generate_project_zip(project_schema: ProjectSchema) -> bytes:
             "app = FastAPI(title='Generated App')",
             ""
         ])
-        
-        # Admin Setup
+    
+    if project_schema.observability.enabled:
         main_lines.extend([
-            "# Admin Panel",
-            "admin_panel = Admin(app, database.engine)",
+            "# Metrics: request timing middleware, SQL cursor hooks and auth timing",
+            "observability.install(app, database.engine)",
             ""
         ])
-        
-        # Register Admin Views
-        for model_name in project_schema.models.keys():
-            main_lines.append(f"admin_panel.add_view(admin.{model_name}Admin)")
-        if "User" not in project_schema.models: # Add UserAdmin if implicitly created
-             main_lines.append("admin_panel.add_view(admin.UserAdmin)")
-             
-        main_lines.append("")
-        
-        # Include routers
-        main_lines.append("app.include_router(auth.router)")
-        main_lines.extend(router_inclusions)
-        
+
+    # Admin Setup
+    main_lines.extend([
+        "# Admin Panel",
+        "admin_panel = Admin(app, database.engine)",
+        ""
+    ])
+    
+    # Register Admin Views
+    for model_name in project_schema.models.keys():
+        main_lines.append(f"admin_panel.add_view(admin.{model_name}Admin)")
+    if "User" not in project_schema.models: # Add UserAdmin if implicitly created
+         main_lines.append("admin_panel.add_view(admin.UserAdmin)")
+         
+    main_lines.append("")
+    
+    # Include routers
+    main_lines.append("app.include_router(auth.router)")
+    main_lines.extend(router_inclusions)
+    
+    main_lines.extend([
+        "",
+        "@app.get('/')",
+        "def read_root():",
+        "    return {'message': 'Welcome to your generated API. Go to /docs for API or /admin for Admin Panel'}",
+        "",
+        "@app.get('/metrics/db-pool', tags=['Metrics'])",
+        "def read_db_pool_metrics():",
+        "    return database.pool_metrics.snapshot()",
+        ""
+    ])
+    if project_schema.observability.enabled:
         main_lines.extend([
-            "",
-            "@app.get('/')",
-            "def read_root():",
-            "    return {'message': 'Welcome to your generated API. Go to /docs for API or /admin for Admin Panel'}",
+            "@app.get('/metrics', tags=['Metrics'], response_class=Response)",
+            "def read_metrics():",
+            "    return Response(observability.render_metrics(), media_type=observability.CONTENT_TYPE)",
             ""
         ])
-        
-        zip_file.writestr("app/main.py", "\n".join(main_lines))
-        
-        # 7. Seed Data
-        from .seed_gen import generate_seed_file
-        zip_file.writestr("seed.py", generate_seed_file(project_schema.models))
+    if project_schema.cache.enabled:
+        main_lines.extend([
+            "@app.get('/metrics/cache', tags=['Metrics'])",
+            "def read_cache_metrics():",
+            "    from .response_cache import response_cache",
+            "    return response_cache.stats()",
+            ""
+        ])
+    
+    yield "app/main.py", "\n".join(main_lines)
+    
+    # 7. Seed Data (parents first; the load test creates rows in the same order)
+    from .seed_gen import generate_seed_file, seed_order
+    with span("generate.seed_order"):
+        order = seed_order(project_schema.models)
+    with span("generate.seed_file"):
+        content = generate_seed_file(project_schema.models, model_seeds, async_mode, order)
+    del model_seeds
+    yield "seed.py", content
+
+    # 8. Run script
+    from .bench_gen import generate_bench_file
+    with span("generate.bench_file"):
+        content = generate_bench_file(project_schema, order)
+    yield "bench/loadtest.py", content
+    yield "run.py", "import uvicorn\n\nif __name__ == '__main__':\n    uvicorn.run('app.main:app', reload=True)"
+
+class _ChunkSink:
+    """Write-only, unseekable file object: zipfile then streams entries with data descriptors."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
 
-        # 8. Run script
-        zip_file.writestr("run.py", "import uvicorn\n\nif __name__ == '__main__':\n    uvicorn.run('app.main:app', reload=True)")
+    def flush(self):
+        pass
 
-    return zip_buffer.getvalue()
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def iter_zip(files: Iterable[Tuple[str, str]]) -> Iterator[bytes]:
+    """Stream an archive: each file is deflated and handed out before the next one is pulled."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for path, content in files:
+            with span("zip.deflate"):
+                _write(zip_file, path, content)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    chunk = sink.drain() # Central directory
+    if chunk:
+        yield chunk
+
+def iter_project_zip(project_schema: ProjectSchema) -> Iterator[bytes]:
+    return iter_zip(iter_project_files(project_schema))
+
+def generate_project_zip(project_schema: ProjectSchema) -> bytes:
+    return b"".join(iter_project_zip(project_schema))
@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 from ..schemas import ModelDefinition
 
 TYPE_MAPPING = {
@@ -10,9 +10,18 @@ TYPE_MAPPING = {
     "text": "Text"
 }
 
-def generate_models_file(models: Dict[str, ModelDefinition]) -> str:
+# Account state the generated auth reads: role, disabled flag and token revocation counter
+USER_ACCOUNT_COLUMNS = [
+    "    is_active = Column(Boolean, default=True, nullable=False)",
+    "    is_admin = Column(Boolean, default=False, nullable=False)",
+    "    token_version = Column(Integer, default=0, nullable=False)",
+]
+USER_ACCOUNT_FIELDS = ["is_active", "is_admin", "token_version"]
+
+def generate_models_file(models: Dict[str, ModelDefinition], model_sections: Optional[List[List[str]]] = None) -> str:
+    # model_sections: pre-rendered generate_model_class() output per model, in model order
     lines = [
-        "from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, Text, ForeignKey, create_engine",
+        "from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, Text, ForeignKey, Index, UniqueConstraint, create_engine",
         "from sqlalchemy.orm import relationship, declarative_base",
         "from datetime import datetime",
         "",
@@ -28,43 +37,85 @@ def generate_models_file(models: Dict[str, ModelDefinition]) -> str:
         lines.append("    id = Column(Integer, primary_key=True, index=True)")
         lines.append("    email = Column(String, unique=True, index=True)")
         lines.append("    hashed_password = Column(String)")
+        lines.extend(USER_ACCOUNT_COLUMNS)
         lines.append("")
     
-    for model_name, model_def in models.items():
-        lines.append(f"class {model_name}(Base):")
-        lines.append(f"    __tablename__ = '{model_name.lower()}s'")
-        lines.append(f"    id = Column(Integer, primary_key=True, index=True)")
+    if model_sections is None:
+        model_sections = [generate_model_class(model_name, model_def) for model_name, model_def in models.items()]
+    for section in model_sections:
+        lines.extend(section)
         
-        # Special handling for User model if defined by user to ensure auth fields
-        if model_name == "User":
-             lines.append("    email = Column(String, unique=True, index=True)")
-             lines.append("    hashed_password = Column(String)")
+    return "\n".join(lines)
 
-        # Fields
-        for field_name, field_def in model_def.fields.items():
-            if field_name == "id": continue 
-            if model_name == "User" and field_name in ["email", "password", "hashed_password"]: continue # Skip custom auth fields if already handled
-            
-            sa_type = TYPE_MAPPING.get(field_def.type.lower(), "String")
-            nullable = "True" if not field_def.required else "False"
-            lines.append(f"    {field_name} = Column({sa_type}, nullable={nullable})")
-            
-        # Relations (Simple One-to-Many implementation for MVP)
-        # Assuming format: "user_id": "User" means this model belongs to User
-        if model_def.relations:
-            for field_name, target_model in model_def.relations.items():
-                 # Foreign Key Column e.g. user_id = Column(Integer, ForeignKey("users.id"))
-                 # We assume the relation field name is the foreign key itself
-                lines.append(f"    {field_name} = Column(Integer, ForeignKey('{target_model.lower()}s.id'))")
-                
-                # Relationship e.g. user = relationship("User", back_populates="posts")
-                # We need to guess the back_populates name or just not use it for MVP simplicity if possible
-                # But for SQLAlchemy we usually need it.
-                # Let's simple it:
-                # relation_name: "user" derived from "user_id"
-                rel_name = field_name.replace("_id", "")
-                lines.append(f"    {rel_name} = relationship('{target_model}')")
+def generate_model_class(model_name: str, model_def: ModelDefinition) -> List[str]:
+    lines = []
+    lines.append(f"class {model_name}(Base):")
+    table_name = f"{model_name.lower()}s"
+    lines.append(f"    __tablename__ = '{table_name}'")
+    if model_def.indexes:
+        # Composite indexes and multi-column unique constraints
+        lines.append("    __table_args__ = (")
+        for index in model_def.indexes:
+            columns = ", ".join(f"'{name}'" for name in index.fields)
+            if index.unique:
+                name = index.name or f"uq_{table_name}_{'_'.join(index.fields)}"
+                lines.append(f"        UniqueConstraint({columns}, name='{name}'),")
+            else:
+                name = index.name or f"ix_{table_name}_{'_'.join(index.fields)}"
+                lines.append(f"        Index('{name}', {columns}),")
+        lines.append("    )")
+    lines.append(f"    id = Column(Integer, primary_key=True, index=True)")
+    
+    # Special handling for User model if defined by user to ensure auth fields
+    if model_name == "User":
+         lines.append("    email = Column(String, unique=True, index=True)")
+         lines.append("    hashed_password = Column(String)")
+         lines.extend(USER_ACCOUNT_COLUMNS)
 
-        lines.append("")
+    # Fields
+    for field_name, field_def in model_def.fields.items():
+        if field_name == "id": continue 
+        if model_name == "User" and field_name in ["email", "password", "hashed_password", *USER_ACCOUNT_FIELDS]: continue # Skip custom auth fields if already handled
         
-    return "\n".join(lines)
+        sa_type = TYPE_MAPPING.get(field_def.type.lower(), "String")
+        nullable = "True" if not field_def.required else "False"
+        options = ""
+        if field_def.unique:
+            options += ", unique=True"
+        if field_def.index or field_def.unique:
+            options += ", index=True"
+        lines.append(f"    {field_name} = Column({sa_type}, nullable={nullable}{options})")
+        
+    # Relations (Simple One-to-Many implementation for MVP)
+    # Assuming format: "user_id": "User" means this model belongs to User
+    for field_name, target_model, rel_name, backref_name in relation_attributes(model_name, model_def):
+        # Foreign Key Column e.g. user_id = Column(Integer, ForeignKey("users.id"))
+        # We assume the relation field name is the foreign key itself
+        # Indexed: joins and filters on the relation would otherwise scan the table
+        lines.append(f"    {field_name} = Column(Integer, ForeignKey('{target_model.lower()}s.id'), index=True)")
+
+        # Relationship e.g. user = relationship("User", backref="posts")
+        # The backref adds the collection on the target (User.posts) without touching its class,
+        # so each model is still rendered from its own definition alone
+        options = f", foreign_keys=[{field_name}], backref='{backref_name}'"
+        if target_model == model_name:
+            options += ", remote_side=[id]" # Self-reference: this row is the child
+        lines.append(f"    {rel_name} = relationship('{target_model}'{options})")
+
+    lines.append("")
+    return lines
+
+def relation_attributes(model_name: str, model_def: ModelDefinition) -> List[Tuple[str, str, str, str]]:
+    """(fk column, target model, relationship name, collection name on the target) per relation."""
+    relations = model_def.relations or {}
+    targets = list(relations.values())
+    attributes = []
+    for field_name, target_model in relations.items():
+        # relation_name: "user" derived from "user_id"
+        rel_name = field_name.replace("_id", "")
+        # Post.author -> Author.posts; a second relation to the same target -> Author.editor_posts
+        backref_name = f"{model_name.lower()}s"
+        if targets.count(target_model) > 1:
+            backref_name = f"{rel_name}_{backref_name}"
+        attributes.append((field_name, target_model, rel_name, backref_name))
+    return attributes
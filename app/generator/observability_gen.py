@@ -0,0 +1,286 @@
+from ..schemas import ObservabilitySettings
+
+OBSERVABILITY_PY = """
+import bisect
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from . import auth, database
+
+# Prometheus metrics, per-request SQL timing and a slow-query log.
+# Each request's time is split into three parts that add up to the total:
+#   db   - cursor execution of every query, including those made while authenticating
+#   auth - resolving the caller (token decoding, user cache), without its queries
+#   app  - the rest: request validation, handler code and response serialization
+# They are exported as histograms per route and, per response, as a Server-Timing header.
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "__SLOW_QUERY_MS__"))
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "1") == "1"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE") # Anything else is counted as OTHER
+
+slow_query_log = logging.getLogger("app.slow_query")
+
+def _escape(value: str) -> str:
+    return value.replace("\\\\", "\\\\\\\\").replace('"', '\\\\"').replace("\\n", "\\\\n")
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values: str, amount: float = 1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(f"{self.name}{_labels(self.labels, key)} {_number(value)}" for key, value in items)
+        return lines
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *values: str, amount: float = 1):
+        self.inc(*values, amount=-amount)
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * (len(self.buckets) + 1), 0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, [list(series[0]), series[1], series[2]]) for key, series in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        bucket_labels = self.labels + ("le",)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = bound if isinstance(bound, str) else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(bucket_labels, key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status code", ("method", "route", "status"))
+IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being handled", ("method",))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Total time per request", ("method", "route"))
+DB_SECONDS = Histogram("http_request_db_seconds", "Time spent executing queries per request", ("method", "route"))
+DB_QUERIES = Histogram("http_request_db_queries", "Queries executed per request", ("method", "route"), QUERY_COUNT_BUCKETS)
+AUTH_SECONDS = Histogram("http_request_auth_seconds", "Time spent resolving the caller, without its queries", ("method", "route"))
+APP_SECONDS = Histogram("http_request_app_seconds", "Time outside queries and auth: validation, handler and serialization", ("method", "route"))
+QUERIES = Counter("db_queries_total", "Queries executed", ("operation",))
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "Cursor execution time per query", ("operation",))
+SLOW_QUERIES = Counter("db_slow_queries_total", "Queries slower than SLOW_QUERY_MS", ("operation",))
+METRICS = [REQUESTS, IN_PROGRESS, REQUEST_SECONDS, DB_SECONDS, DB_QUERIES, AUTH_SECONDS, APP_SECONDS, QUERIES, QUERY_SECONDS, SLOW_QUERIES]
+
+# database.pool_metrics snapshot key -> (metric name, type, help)
+POOL_METRICS = {
+    "checked_out": ("db_pool_checked_out", "gauge", "Connections currently checked out"),
+    "peak_checked_out": ("db_pool_checked_out_peak", "gauge", "Most connections checked out at once"),
+    "idle": ("db_pool_idle", "gauge", "Open connections waiting in the pool"),
+    "overflow": ("db_pool_overflow", "gauge", "Connections open beyond pool_size"),
+    "pool_size": ("db_pool_size", "gauge", "Configured pool size"),
+    "max_overflow": ("db_pool_max_overflow", "gauge", "Configured overflow limit"),
+    "connects": ("db_pool_connects_total", "counter", "New database connections"),
+    "checkouts": ("db_pool_checkouts_total", "counter", "Connection checkouts"),
+    "invalidations": ("db_pool_invalidations_total", "counter", "Connections invalidated after errors"),
+}
+
+class RequestTimings:
+    \"\"\"What one request spent where; shared by everything that runs for the request.\"\"\"
+    __slots__ = ("target", "queries", "db", "auth", "authenticated")
+
+    def __init__(self, target: str):
+        self.target = target
+        self.queries = 0
+        self.db = 0.0
+        self.auth = 0.0
+        self.authenticated = False
+
+    def app(self, total: float) -> float:
+        return max(0.0, total - self.db - self.auth)
+
+    def server_timing(self, total: float) -> str:
+        parts = [f'db;dur={self.db * 1000:.2f};desc="queries: {self.queries}"']
+        if self.authenticated:
+            parts.append(f"auth;dur={self.auth * 1000:.2f}")
+        parts.append(f"app;dur={self.app(total) * 1000:.2f}")
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+def _operation(statement: str) -> str:
+    word = statement.lstrip()[:6].upper()
+    return word if word in OPERATIONS else "OTHER"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started_at"] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = conn.info.pop("query_started_at", None)
+    if started_at is None:
+        return
+    elapsed = time.perf_counter() - started_at
+    operation = _operation(statement)
+    QUERIES.inc(operation)
+    QUERY_SECONDS.observe(elapsed, operation)
+    timings = _current.get()
+    if timings is not None:
+        timings.queries += 1
+        timings.db += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc(operation)
+        # Parameters are left out: they may hold personal data
+        slow_query_log.warning(
+            "Slow query (%.1f ms) in %s: %s",
+            elapsed * 1000, timings.target if timings else "background", " ".join(statement.split())[:2000],
+        )
+
+def timed_auth(func):
+    \"\"\"Wrap an auth dependency so its time (minus its queries) is counted as auth.\"\"\"
+    def finish(timings: Optional[RequestTimings], began: float, db_before: float):
+        if timings is not None:
+            timings.auth += (time.perf_counter() - began) - (timings.db - db_before)
+            timings.authenticated = True
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            timings = _current.get()
+            began, db_before = time.perf_counter(), timings.db if timings else 0.0
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                finish(timings, began, db_before)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _current.get()
+            began, db_before = time.perf_counter(), timings.db if timings else 0.0
+            try:
+                return func(*args, **kwargs)
+            finally:
+                finish(timings, began, db_before)
+    return wrapper
+
+def route_label(scope) -> str:
+    # The route template (/posts/{item_id}), so ids do not each get their own series;
+    # root_path carries the prefix of mounted apps such as /admin
+    path = getattr(scope.get("route"), "path", None)
+    return scope.get("root_path", "") + path if path is not None else "unmatched"
+
+def record_request(scope, status: int, elapsed: float, timings: RequestTimings):
+    method, route = scope["method"], route_label(scope)
+    REQUESTS.inc(method, route, str(status))
+    REQUEST_SECONDS.observe(elapsed, method, route)
+    DB_SECONDS.observe(timings.db, method, route)
+    DB_QUERIES.observe(timings.queries, method, route)
+    if timings.authenticated:
+        AUTH_SECONDS.observe(timings.auth, method, route)
+    APP_SECONDS.observe(timings.app(elapsed), method, route)
+
+class MetricsMiddleware:
+    \"\"\"Times every HTTP request and adds a Server-Timing header to its response.\"\"\"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings(f"{scope['method']} {scope['path']}")
+        token = _current.set(timings)
+        began = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING:
+                    MutableHeaders(scope=message).append("Server-Timing", timings.server_timing(time.perf_counter() - began))
+            await send(message)
+
+        IN_PROGRESS.inc(scope["method"])
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            IN_PROGRESS.dec(scope["method"])
+            _current.reset(token)
+            record_request(scope, status, time.perf_counter() - began, timings)
+
+def render_pool_metrics() -> List[str]:
+    lines = []
+    for key, value in database.pool_metrics.snapshot().items():
+        if key not in POOL_METRICS:
+            continue
+        name, kind, help = POOL_METRICS[key]
+        if key == "overflow":
+            value = max(0, value) # QueuePool reports unused capacity as negative overflow
+        lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"])
+    return lines
+
+def render_metrics() -> str:
+    \"\"\"Every metric in the Prometheus text exposition format.\"\"\"
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(render_pool_metrics())
+    return "\\n".join(lines) + "\\n"
+
+def install(app, engine):
+    \"\"\"Hook the middleware, SQL timing and auth timing into the app; call once at import.\"\"\"
+    sync_engine = getattr(engine, "sync_engine", engine) # Cursor events live on the sync core of an async engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    app.add_middleware(MetricsMiddleware)
+    # An override reaches every route and dependency (get_current_admin, get_user_record) built on it
+    app.dependency_overrides[auth.get_current_user] = timed_auth(auth.get_current_user)
+"""
+
+def generate_observability_file(settings: ObservabilitySettings) -> str:
+    return OBSERVABILITY_PY.replace("__SLOW_QUERY_MS__", str(settings.slow_query_ms))
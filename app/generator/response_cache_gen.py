@@ -0,0 +1,234 @@
+from ..schemas import CacheSettings
+
+RESPONSE_CACHE_PY = """
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+
+# Read-through cache for GET endpoints. Every key embeds a version number per model it
+# read from; a write to a model bumps that version, so all of its cached pages (and any
+# other model's pages that embedded it via ?include=) are skipped from then on and age out.
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory") # memory, redis or off
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "__TTL__"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "__MAX_ENTRIES__"))
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+CACHE_PREFIX = os.environ.get("CACHE_PREFIX", "response-cache:")
+
+# Headers worth replaying on a hit (pagination cursor)
+CACHED_HEADERS = ("x-next-cursor",)
+
+class MemoryBackend:
+    \"\"\"In-process TTL + LRU store (one per worker process).\"\"\"
+    blocking = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def versions(self, namespaces: List[str]) -> List[int]:
+        with self._lock:
+            return [self._versions.get(namespace, 0) for namespace in namespaces]
+
+    def bump(self, namespace: str):
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def size(self) -> int:
+        return len(self._entries)
+
+class RedisBackend:
+    \"\"\"Shared store for several workers; `client` is a redis-py compatible client.\"\"\"
+    blocking = True
+
+    def __init__(self, client, prefix: str = CACHE_PREFIX):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        import redis # Only needed with CACHE_BACKEND=redis
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def versions(self, namespaces: List[str]) -> List[int]:
+        values = self.client.mget([f"{self.prefix}version:{namespace}" for namespace in namespaces])
+        return [int(value or 0) for value in values]
+
+    def bump(self, namespace: str):
+        self.client.incr(f"{self.prefix}version:{namespace}")
+
+    def size(self) -> int:
+        return self.client.dbsize()
+
+class FakeRedis:
+    \"\"\"In-memory stand-in for the redis-py calls RedisBackend makes, for tests and local runs.\"\"\"
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], Any]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._live(key)
+            return entry[1] if entry else None
+
+    def set(self, key: str, value, ex: Optional[int] = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ex if ex else None, value)
+
+    def mget(self, keys: List[str]):
+        return [self.get(key) for key in keys]
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            entry = self._live(key)
+            value = int(entry[1]) + 1 if entry else 1
+            self._data[key] = (None, str(value).encode())
+            return value
+
+    def dbsize(self) -> int:
+        with self._lock:
+            return sum(1 for key in list(self._data) if self._live(key))
+
+class NullBackend:
+    blocking = False
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        pass
+
+    def versions(self, namespaces: List[str]) -> List[int]:
+        return [0] * len(namespaces)
+
+    def bump(self, namespace: str):
+        pass
+
+    def size(self) -> int:
+        return 0
+
+class ResponseCache:
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, namespaces: List[str], request: Request, level: str) -> str:
+        versions = self.backend.versions(namespaces)
+        query = urlencode(sorted(request.query_params.multi_items())) # Parameter order does not matter
+        tags = ",".join(f"{namespace}:{version}" for namespace, version in zip(namespaces, versions))
+        return f"{level}|{request.url.path}?{query}|{tags}"
+
+    def lookup(self, namespaces: List[str], request: Request, level: str) -> Tuple[str, Optional[Response]]:
+        \"\"\"(key to store under, cached response or None).\"\"\"
+        key = self._key(namespaces, request, level)
+        cached = self.backend.get(key)
+        if cached is None:
+            self.misses += 1
+            return key, None
+        self.hits += 1
+        headers, body = json.loads(cached)
+        return key, Response(body, media_type="application/json", headers=headers)
+
+    def respond(self, key: str, content: Any, response: Response) -> Response:
+        body = json.dumps(jsonable_encoder(content), separators=(",", ":"))
+        headers = {name: value for name, value in response.headers.items() if name in CACHED_HEADERS}
+        self.backend.set(key, json.dumps([headers, body]).encode(), self.ttl)
+        return Response(body, media_type="application/json", headers=headers)
+
+    def invalidate(self, *namespaces: str):
+        for namespace in namespaces:
+            self.backend.bump(namespace)
+
+    # Async handlers: an external backend is network I/O, keep it off the event loop
+    async def alookup(self, namespaces: List[str], request: Request, level: str) -> Tuple[str, Optional[Response]]:
+        if self.backend.blocking:
+            return await run_in_threadpool(self.lookup, namespaces, request, level)
+        return self.lookup(namespaces, request, level)
+
+    async def arespond(self, key: str, content: Any, response: Response) -> Response:
+        if self.backend.blocking:
+            return await run_in_threadpool(self.respond, key, content, response)
+        return self.respond(key, content, response)
+
+    async def ainvalidate(self, *namespaces: str):
+        if self.backend.blocking:
+            await run_in_threadpool(self.invalidate, *namespaces)
+        else:
+            self.invalidate(*namespaces)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": CACHE_BACKEND,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": self.backend.size(),
+        }
+
+def cache_namespaces(model_name: str, includes: Dict[str, Any], names: List[str]) -> List[str]:
+    \"\"\"Models a response was read from: the model itself plus every embedded relation.\"\"\"
+    return [model_name] + [includes[name].model for name in names]
+
+def cache_level(user) -> str:
+    return "admin" if getattr(user, "is_admin", False) else "user"
+
+def create_backend():
+    if CACHE_BACKEND == "redis":
+        return RedisBackend.from_url(REDIS_URL)
+    if CACHE_BACKEND == "off":
+        return NullBackend()
+    return MemoryBackend(CACHE_MAX_ENTRIES)
+
+response_cache = ResponseCache(create_backend(), CACHE_TTL)
+"""
+
+def generate_response_cache_file(settings: CacheSettings) -> str:
+    return (
+        RESPONSE_CACHE_PY
+        .replace("__TTL__", str(settings.ttl_seconds))
+        .replace("__MAX_ENTRIES__", str(settings.max_entries))
+    )
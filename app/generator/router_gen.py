@@ -1,27 +1,106 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 from ..schemas import ModelDefinition
+from .models_gen import relation_attributes, USER_ACCOUNT_FIELDS
 
-def generate_router_file(model_name: str, model_def: ModelDefinition, api_config: Dict[str, str]) -> str:
+def sort_fields(model_name: str, model_def: ModelDefinition) -> List[str]:
+    # Keyset paging needs an index to seek on and no NULLs to skip over
+    names = ["id"]
+    for field_name, field_def in model_def.fields.items():
+        if field_name == "id": continue
+        if model_name == "User" and field_name in ["email", "password", "hashed_password", *USER_ACCOUNT_FIELDS]: continue
+        if (field_def.index or field_def.unique) and field_def.required:
+            names.append(field_name)
+    return names
+
+def response_fields(model_name: str, model_def: ModelDefinition) -> List[str]:
+    # The columns {Model}Response serializes, i.e. what ?fields= may ask for
+    names = ["id"] + (["email"] if model_name == "User" else [])
+    for field_name in model_def.fields:
+        if model_name == "User" and field_name in ["email", "password", "hashed_password", *USER_ACCOUNT_FIELDS]: continue
+        names.append(field_name)
+    names.extend(model_def.relations or {})
+    return list(dict.fromkeys(names))
+
+# Access levels from least to most restrictive
+ACCESS_RANK = {"public": 0, "auth": 1, "admin": 2}
+
+def can_include(read_level: str, target_level: str) -> bool:
+    # Embedding must not reveal rows the caller couldn't read from the target's own endpoints
+    return target_level != "off" and ACCESS_RANK.get(target_level, 0) <= ACCESS_RANK.get(read_level, 0)
+
+def generate_router_file(model_name: str, model_def: ModelDefinition, api_config: Dict[str, str], async_mode: bool = False,
+                         incoming: Sequence[Tuple[str, str, str]] = (), cache: bool = False,
+                         read_levels: Optional[Dict[str, str]] = None) -> str:
     # api_config: {"create": "auth", "read": "public", ...}
+    # async_mode: async def endpoints on an AsyncSession, queries via select()
+    # incoming: (collection name, child model, child foreign key) for relations other models declare to this one
+    # cache: serve GETs through the generated response cache, invalidated by every write
+    # read_levels: read access level of each related model; ?include= only offers those this endpoint's callers may read
     
     lower_name = model_name.lower()
+    func = "async def" if async_mode else "def"
+    session = "AsyncSession" if async_mode else "Session"
+    aw = "await " if async_mode else ""
+    sort_columns = ", ".join(f"'{name}': Model{model_name}.{name}" for name in sort_fields(model_name, model_def))
+    field_names = ", ".join(f"'{name}'" for name in response_fields(model_name, model_def))
+    read_level = api_config.get("read", "public")
+    includable = lambda target: can_include(read_level, (read_levels or {}).get(target, "public"))
     
     lines = [
-        "from fastapi import APIRouter, Depends, HTTPException",
-        "from sqlalchemy.orm import Session",
-        "from typing import List",
+        "from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response" if cache else "from fastapi import APIRouter, Depends, HTTPException, Query, Response",
+        "from sqlalchemy import select, insert, update, delete",
+        "from sqlalchemy.exc import IntegrityError",
+        "from sqlalchemy.orm import joinedload, selectinload",
+        "from sqlalchemy.ext.asyncio import AsyncSession" if async_mode else "from sqlalchemy.orm import Session",
+        "from typing import Any, Dict, List, Optional",
         f"from ..database import get_db, engine",
+        "from ..pagination import MAX_PAGE_SIZE, keyset_page, finish_page",
+        "from ..bulk import check_batch_size, validate_items, split_missing, bulk_result",
+        "from ..includes import Include, parse_includes, include_options, parse_fields, field_options, serialize, sparse_response",
+        "from .. import models, schemas",
+        "from ..response_cache import response_cache, cache_namespaces, cache_level" if cache else "",
         f"from ..models import {model_name} as Model{model_name}",
         # f"from ..schemas import {model_name} as Schema{model_name}", 
         # Note: In schemas_gen we created {model_name}Create, {model_name}Response etc.
         # We need to assume the schema file structure or imports. 
         # Let's adjust imports to be specific
-        f"from ..schemas import {model_name}Create, {model_name}Update, {model_name}Response",
+        f"from ..schemas import {model_name}Create, {model_name}Update, {model_name}Patch, {model_name}Response, {model_name}ResponseNested, BulkResult, BulkDelete",
         # Auth import placeholder
-        "from ..auth import get_current_user" if "auth" in api_config.values() or "admin" in api_config.values() else "",
+        "from ..auth import get_current_user, get_current_admin" if "auth" in api_config.values() or "admin" in api_config.values() else "",
+        "from ..auth import get_password_hash" if model_name == "User" else "",
+        "from starlette.concurrency import run_in_threadpool" if model_name == "User" and async_mode else "",
         "",
         f"router = APIRouter(prefix='/{lower_name}s', tags=['{model_name}'])",
         "",
+        "# Columns the list endpoint can order and page by (?sort=name, ?sort=-name)",
+        f"SORT_FIELDS = {{{sort_columns}}}",
+        "",
+        "# Columns ?fields= can narrow the SELECT and the response to (id is always returned)",
+        f"FIELDS = [{field_names}]",
+        "",
+        "# UPDATE/DELETE ... RETURNING (SQLite 3.35+, Postgres) make a write one round trip",
+        "UPDATE_RETURNING = engine.dialect.update_returning",
+        "DELETE_RETURNING = engine.dialect.delete_returning",
+        "",
+        "# Relations ?include= can embed: a parent comes in the same query (joinedload),",
+        "# a collection in one extra IN query for the whole page (selectinload).",
+        "# Models stricter to read than this router's list/detail endpoints are left out.",
+        "INCLUDES = {",
+        *[f"    '{rel_name}': Include(joinedload, schemas.{target}Response, many=False, model='{target}')," for _, target, rel_name, _ in relation_attributes(model_name, model_def) if includable(target)],
+        *[f"    '{collection}': Include(selectinload, schemas.{child}Response, many=True, model='{child}')," for collection, child, _ in incoming if includable(child)],
+        "}",
+        "",
+        *([
+            "# Accounts store a hash, never the password (as /auth/register does)",
+            "def hash_passwords(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:",
+            "    hashed = []",
+            "    for row in rows:",
+            "        row = dict(row)",
+            "        row['hashed_password'] = get_password_hash(row.pop('password'))",
+            "        hashed.append(row)",
+            "    return hashed",
+            "",
+        ] if model_name == "User" else []),
         "# Dependency injection helper for Auth",
         "# (In a real app, strict permissions would be checked here)",
         ""
@@ -33,64 +112,237 @@ def generate_router_file(model_name: str, model_def: ModelDefinition, api_config
         if perm == "auth":
              return ", user: dict = Depends(get_current_user)"
         elif perm == "admin":
-             return ", user: dict = Depends(get_current_user)" # Add admin check logic later
+             return ", user: dict = Depends(get_current_admin)" # 403 unless the token carries the admin role
         return ""
 
+    def commit_or_conflict():
+        # Unique columns/constraints: a duplicate is the client's error, not a 500
+        return [
+            f"    try:",
+            f"        {aw}db.commit()",
+            f"    except IntegrityError as e:",
+            f"        {aw}db.rollback()",
+            f"        raise HTTPException(status_code=409, detail=f'Conflicts with an existing {model_name}: {{e.orig}}')",
+        ]
+
+    def invalidate_cache(indent: int = 4, deleting: bool = False):
+        # A write bumps the cache version of the models whose responses it can change;
+        # deleting a row also detaches its children (their foreign key is nulled)
+        if not cache:
+            return []
+        models = [model_name] + ([child for _, child, _ in incoming] if deleting else [])
+        names = ", ".join(f"'{name}'" for name in dict.fromkeys(models))
+        call = "await response_cache.ainvalidate" if async_mode else "response_cache.invalidate"
+        return [" " * indent + f"{call}({names})"]
+
+    def cache_lookup():
+        if not cache:
+            return []
+        level = "cache_level(user)" if get_dep("read") else "'public'"
+        call = "await response_cache.alookup" if async_mode else "response_cache.lookup"
+        return [
+            f"    key, cached = {call}(cache_namespaces('{model_name}', INCLUDES, includes), request, {level})",
+            f"    if cached is not None:",
+            f"        return cached",
+        ]
+
+    def respond(content: str, headers: str = ""):
+        if not cache:
+            # Sparse rows lack required columns, so they bypass response_model validation
+            return f"    return sparse_response({content}, fields{headers})"
+        call = "await response_cache.arespond" if async_mode else "response_cache.respond"
+        return f"    return {call}(key, {content}, response)"
+
     # CREATE
     if api_config.get("create") != "off":
         lines.append(f"@router.post('/', response_model={model_name}Response)")
-        lines.append(f"def create_{lower_name}(item: {model_name}Create{get_dep('create')}, db: Session = Depends(get_db)):")
-        lines.append(f"    db_item = Model{model_name}(**item.dict())")
+        lines.append(f"{func} create_{lower_name}(item: {model_name}Create{get_dep('create')}, db: {session} = Depends(get_db)):")
+        if model_name == "User":
+            # Hashing is CPU bound: in async mode it runs off the event loop
+            hashing = "await run_in_threadpool(hash_passwords, [item.dict()])" if async_mode else "hash_passwords([item.dict()])"
+            lines.append(f"    [values] = {hashing}")
+            lines.append(f"    db_item = Model{model_name}(**values)")
+        else:
+            lines.append(f"    db_item = Model{model_name}(**item.dict())")
         lines.append(f"    db.add(db_item)")
-        lines.append(f"    db.commit()")
-        lines.append(f"    db.refresh(db_item)")
+        lines.extend(commit_or_conflict())
+        lines.extend(invalidate_cache())
+        lines.append(f"    {aw}db.refresh(db_item)")
         lines.append(f"    return db_item")
         lines.append("")
 
     # READ LIST
     if api_config.get("read") != "off":
-        lines.append(f"@router.get('/', response_model=List[{model_name}Response])")
-        lines.append(f"def read_{lower_name}s(skip: int = 0, limit: int = 100{get_dep('read')}, db: Session = Depends(get_db)):")
-        lines.append(f"    return db.query(Model{model_name}).offset(skip).limit(limit).all()")
+        lines.append(f"@router.get('/', response_model=List[{model_name}ResponseNested], response_model_exclude_unset=True)")
+        lines.append(f"{func} read_{lower_name}s({'request: Request, ' if cache else ''}response: Response, skip: int = 0, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None, sort: str = 'id', fields: Optional[str] = None, include: Optional[str] = None{get_dep('read')}, db: {session} = Depends(get_db)):")
+        lines.append(f"    fields = parse_fields(fields, FIELDS)")
+        lines.append(f"    includes = parse_includes(include, INCLUDES)")
+        lines.extend(cache_lookup())
+        lines.append(f"    # Only the requested columns are selected; the sort key is kept for the next cursor")
+        lines.append(f"    options = field_options(Model{model_name}, fields, sort.lstrip('-')) + include_options(Model{model_name}, INCLUDES, includes)")
+        lines.append(f"    stmt = select(Model{model_name}).options(*options)")
+        lines.append(f"    if skip:")
+        lines.append(f"        # OFFSET paging, kept for existing clients: cost grows with skip")
+        lines.append(f"        if cursor:")
+        lines.append(f"            raise HTTPException(status_code=400, detail='Use either skip or cursor, not both')")
+        lines.append(f"        result = {aw}db.execute(stmt.order_by(Model{model_name}.id).offset(skip).limit(limit))")
+        lines.append(f"        items = result.scalars().all()")
+        lines.append(f"    else:")
+        lines.append(f"        # Keyset paging: the next page's cursor comes back in the X-Next-Cursor header")
+        lines.append(f"        result = {aw}db.execute(keyset_page(stmt, Model{model_name}, SORT_FIELDS, sort, cursor, limit))")
+        lines.append(f"        items = finish_page(result.scalars().all(), sort, limit, response)")
+        lines.append(respond(f"[serialize(item, {model_name}Response, INCLUDES, includes, fields) for item in items]", ", response"))
+        lines.append("")
+
+    # BULK (registered before /{item_id} so "bulk" is never taken for an id)
+    # One statement per batch (executemany / insertmanyvalues) and one commit.
+    # Invalid or unknown items are reported by index; the rest are written.
+    def commit_or_reject():
+        return [
+            f"        {aw}db.commit()",
+            f"    except IntegrityError as e:",
+            f"        {aw}db.rollback()",
+            f"        raise HTTPException(status_code=409, detail=f'Batch rejected, nothing was written: {{e.orig}}')",
+        ]
+
+    if api_config.get("create") != "off":
+        lines.append(f"@router.post('/bulk', response_model=BulkResult)")
+        lines.append(f"{func} create_{lower_name}s_bulk(items: List[Dict[str, Any]]{get_dep('create')}, db: {session} = Depends(get_db)):")
+        lines.append(f"    check_batch_size(items)")
+        lines.append(f"    rows, errors = validate_items(items, {model_name}Create)")
+        if model_name == "User":
+            hashing = "await run_in_threadpool(hash_passwords, values)" if async_mode else "hash_passwords(values)"
+            lines.append(f"    values = [row for _, row in rows]")
+            lines.append(f"    rows = [(index, row) for (index, _), row in zip(rows, {hashing})]")
+        lines.append(f"    ids = []")
+        lines.append(f"    if rows:")
+        lines.append(f"        try:")
+        lines.append(f"            stmt = insert(Model{model_name}).returning(Model{model_name}.id, sort_by_parameter_order=True)")
+        lines.append(f"            result = {aw}db.execute(stmt, [row for _, row in rows])")
+        lines.append(f"            ids = result.scalars().all()")
+        lines.extend(["    " + line for line in commit_or_reject()])
+        lines.extend(invalidate_cache(8))
+        lines.append(f"    return bulk_result([(index, id) for (index, _), id in zip(rows, ids)], errors)")
+        lines.append("")
+
+    if api_config.get("update") != "off":
+        lines.append(f"@router.patch('/bulk', response_model=BulkResult)")
+        lines.append(f"{func} update_{lower_name}s_bulk(items: List[Dict[str, Any]]{get_dep('update')}, db: {session} = Depends(get_db)):")
+        lines.append(f"    check_batch_size(items)")
+        lines.append(f"    rows, errors = validate_items(items, {model_name}Patch, partial=True)")
+        lines.append(f"    if rows:")
+        lines.append(f"        result = {aw}db.execute(select(Model{model_name}.id).where(Model{model_name}.id.in_([row['id'] for _, row in rows])))")
+        lines.append(f"        rows, missing = split_missing(rows, set(result.scalars().all()), '{model_name} not found')")
+        lines.append(f"        errors.extend(missing)")
+        lines.append(f"    changes = [row for _, row in rows if len(row) > 1]")
+        lines.append(f"    if changes:")
+        lines.append(f"        try:")
+        lines.append(f"            # Bulk UPDATE by primary key: rows are grouped by the columns they set")
+        lines.append(f"            {aw}db.execute(update(Model{model_name}), changes)")
+        lines.extend(["    " + line for line in commit_or_reject()])
+        lines.extend(invalidate_cache(8))
+        lines.append(f"    return bulk_result([(index, row['id']) for index, row in rows], errors)")
+        lines.append("")
+
+    if api_config.get("delete") != "off":
+        lines.append(f"@router.delete('/bulk', response_model=BulkResult)")
+        lines.append(f"{func} delete_{lower_name}s_bulk(body: BulkDelete{get_dep('delete')}, db: {session} = Depends(get_db)):")
+        lines.append(f"    check_batch_size(body.ids)")
+        lines.append(f"    rows = [(index, {{'id': id}}) for index, id in enumerate(body.ids)]")
+        lines.append(f"    result = {aw}db.execute(select(Model{model_name}.id).where(Model{model_name}.id.in_(body.ids)))")
+        lines.append(f"    rows, errors = split_missing(rows, set(result.scalars().all()), '{model_name} not found')")
+        lines.append(f"    if rows:")
+        lines.append(f"        ids = [row['id'] for _, row in rows]")
+        lines.append(f"        try:")
+        if incoming:
+            lines.append(f"            # Detach children first, as the single-row delete does")
+        for _, child, fk in incoming:
+            lines.append(f"            {aw}db.execute(update(models.{child}).where(models.{child}.{fk}.in_(ids)).values({fk}=None).execution_options(synchronize_session=False))")
+        lines.append(f"            stmt = delete(Model{model_name}).where(Model{model_name}.id.in_(ids))")
+        lines.append(f"            {aw}db.execute(stmt.execution_options(synchronize_session=False))")
+        lines.extend(["    " + line for line in commit_or_reject()])
+        lines.extend(invalidate_cache(8, deleting=True))
+        lines.append(f"    return bulk_result([(index, row['id']) for index, row in rows], errors)")
         lines.append("")
 
     # READ ONE
     if api_config.get("read") != "off":
-        lines.append(f"@router.get('/{{item_id}}', response_model={model_name}Response)")
-        lines.append(f"def read_{lower_name}(item_id: int{get_dep('read')}, db: Session = Depends(get_db)):")
-        lines.append(f"    item = db.query(Model{model_name}).filter(Model{model_name}.id == item_id).first()")
+        lines.append(f"@router.get('/{{item_id}}', response_model={model_name}ResponseNested, response_model_exclude_unset=True)")
+        lines.append(f"{func} read_{lower_name}({'request: Request, response: Response, ' if cache else ''}item_id: int, fields: Optional[str] = None, include: Optional[str] = None{get_dep('read')}, db: {session} = Depends(get_db)):")
+        lines.append(f"    fields = parse_fields(fields, FIELDS)")
+        lines.append(f"    includes = parse_includes(include, INCLUDES)")
+        lines.extend(cache_lookup())
+        lines.append(f"    options = field_options(Model{model_name}, fields) + include_options(Model{model_name}, INCLUDES, includes)")
+        lines.append(f"    item = {aw}db.get(Model{model_name}, item_id, options=options)")
         lines.append(f"    if item is None:")
         lines.append(f"        raise HTTPException(status_code=404, detail='{model_name} not found')")
-        lines.append(f"    return item")
+        lines.append(respond(f"serialize(item, {model_name}Response, INCLUDES, includes, fields)"))
         lines.append("")
 
     # UPDATE
     if api_config.get("update") != "off":
         lines.append(f"@router.put('/{{item_id}}', response_model={model_name}Response)")
-        lines.append(f"def update_{lower_name}(item_id: int, item_in: {model_name}Update{get_dep('update')}, db: Session = Depends(get_db)):")
-        lines.append(f"    db_item = db.query(Model{model_name}).filter(Model{model_name}.id == item_id).first()")
+        lines.append(f"{func} update_{lower_name}(item_id: int, item_in: {model_name}Update{get_dep('update')}, db: {session} = Depends(get_db)):")
+        lines.append(f"    update_data = item_in.dict(exclude_unset=True)")
+        lines.append(f"    if UPDATE_RETURNING and update_data:")
+        lines.append(f"        # The UPDATE hands back the new row, or nothing for an unknown id")
+        lines.append(f"        stmt = update(Model{model_name}).where(Model{model_name}.id == item_id).values(**update_data).returning(Model{model_name})")
+        lines.append(f"        try:")
+        lines.append(f"            result = {aw}db.execute(stmt)")
+        lines.append(f"            db_item = result.scalar_one_or_none()")
+        lines.append(f"            if db_item is None:")
+        lines.append(f"                raise HTTPException(status_code=404, detail='{model_name} not found')")
+        lines.append(f"            # Serialized before commit expires it, which would cost a reload")
+        lines.append(f"            updated = {model_name}Response.model_validate(db_item)")
+        lines.append(f"            {aw}db.commit()")
+        lines.append(f"        except IntegrityError as e:")
+        lines.append(f"            {aw}db.rollback()")
+        lines.append(f"            raise HTTPException(status_code=409, detail=f'Conflicts with an existing {model_name}: {{e.orig}}')")
+        lines.extend(invalidate_cache(8))
+        lines.append(f"        return updated")
+        lines.append(f"    ")
+        if async_mode:
+            lines.append(f"    db_item = await db.get(Model{model_name}, item_id)")
+        else:
+            lines.append(f"    db_item = db.query(Model{model_name}).filter(Model{model_name}.id == item_id).first()")
         lines.append(f"    if db_item is None:")
         lines.append(f"        raise HTTPException(status_code=404, detail='{model_name} not found')")
         lines.append(f"    ")
-        lines.append(f"    update_data = item_in.dict(exclude_unset=True)")
         lines.append(f"    for key, value in update_data.items():")
         lines.append(f"        setattr(db_item, key, value)")
         lines.append(f"    ")
         lines.append(f"    db.add(db_item)")
-        lines.append(f"    db.commit()")
-        lines.append(f"    db.refresh(db_item)")
+        lines.extend(commit_or_conflict())
+        lines.extend(invalidate_cache())
+        lines.append(f"    {aw}db.refresh(db_item)")
         lines.append(f"    return db_item")
         lines.append("")
 
     # DELETE
     if api_config.get("delete") != "off":
         lines.append(f"@router.delete('/{{item_id}}')")
-        lines.append(f"def delete_{lower_name}(item_id: int{get_dep('delete')}, db: Session = Depends(get_db)):")
-        lines.append(f"    db_item = db.query(Model{model_name}).filter(Model{model_name}.id == item_id).first()")
+        lines.append(f"{func} delete_{lower_name}(item_id: int{get_dep('delete')}, db: {session} = Depends(get_db)):")
+        lines.append(f"    if DELETE_RETURNING:")
+        if incoming:
+            lines.append(f"        # Detach children first, as the ORM delete below does")
+        for _, child, fk in incoming:
+            lines.append(f"        {aw}db.execute(update(models.{child}).where(models.{child}.{fk} == item_id).values({fk}=None))")
+        lines.append(f"        result = {aw}db.execute(delete(Model{model_name}).where(Model{model_name}.id == item_id).returning(Model{model_name}.id))")
+        lines.append(f"        if result.scalar_one_or_none() is None:")
+        lines.append(f"            raise HTTPException(status_code=404, detail='{model_name} not found')")
+        lines.append(f"        {aw}db.commit()")
+        lines.extend(invalidate_cache(8, deleting=True))
+        lines.append(f"        return {{'detail': '{model_name} deleted'}}")
+        lines.append(f"    ")
+        if async_mode:
+            lines.append(f"    db_item = await db.get(Model{model_name}, item_id)")
+        else:
+            lines.append(f"    db_item = db.query(Model{model_name}).filter(Model{model_name}.id == item_id).first()")
         lines.append(f"    if db_item is None:")
         lines.append(f"        raise HTTPException(status_code=404, detail='{model_name} not found')")
-        lines.append(f"    db.delete(db_item)")
-        lines.append(f"    db.commit()")
+        lines.append(f"    {aw}db.delete(db_item)")
+        lines.append(f"    {aw}db.commit()")
+        lines.extend(invalidate_cache(deleting=True))
         lines.append(f"    return {{'detail': '{model_name} deleted'}}")
         lines.append("")
 
@@ -1,5 +1,6 @@
-from typing import Dict
+from typing import Dict, List, Optional, Sequence, Tuple
 from ..schemas import ModelDefinition
+from .models_gen import relation_attributes, USER_ACCOUNT_FIELDS
 
 TYPE_MAPPING = {
     "string": "str",
@@ -10,10 +11,11 @@ TYPE_MAPPING = {
     "text": "str"
 }
 
-def generate_schemas_file(models: Dict[str, ModelDefinition]) -> str:
+def generate_schemas_file(models: Dict[str, ModelDefinition], model_sections: Optional[List[List[str]]] = None) -> str:
+    # model_sections: pre-rendered generate_model_schemas() output per model, in model order
     lines = [
         "from pydantic import BaseModel",
-        "from typing import Optional, List",
+        "from typing import Any, Optional, List",
         "from datetime import datetime",
         "",
         "class Token(BaseModel):",
@@ -22,6 +24,21 @@ def generate_schemas_file(models: Dict[str, ModelDefinition]) -> str:
         "",
         "class TokenData(BaseModel):",
         "    username: Optional[str] = None",
+        "",
+        "class BulkItemResult(BaseModel):",
+        "    index: int",
+        "    id: int",
+        "",
+        "class BulkItemError(BaseModel):",
+        "    index: int",
+        "    detail: Any",
+        "",
+        "class BulkResult(BaseModel):",
+        "    results: List[BulkItemResult] = []",
+        "    errors: List[BulkItemError] = []",
+        "",
+        "class BulkDelete(BaseModel):",
+        "    ids: List[int]",
         ""
     ]
     
@@ -41,59 +58,92 @@ def generate_schemas_file(models: Dict[str, ModelDefinition]) -> str:
             "",""
         ])
 
-    for model_name, model_def in models.items():
-        # Base API Model (Shared properties)
-        lines.append(f"class {model_name}Base(BaseModel):")
-        
-        if model_name == "User":
-             lines.append("    email: str")
+    if model_sections is None:
+        model_sections = [generate_model_schemas(model_name, model_def) for model_name, model_def in models.items()]
+    for section in model_sections:
+        lines.extend(section)
 
-        has_fields = False
-        for field_name, field_def in model_def.fields.items():
-            if field_name == "id": continue
-            if model_name == "User" and field_name in ["email", "password"]: continue
-
-            has_fields = True
-            py_type = TYPE_MAPPING.get(field_def.type.lower(), "str")
-            if not field_def.required:
-                lines.append(f"    {field_name}: Optional[{py_type}] = None")
-            else:
-                lines.append(f"    {field_name}: {py_type}")
+    # Nested responses point at each other by name; resolve once everything is defined
+    for model_name in models:
+        lines.append(f"{model_name}ResponseNested.model_rebuild()")
         
-        # Add relation helper fields (Foreign Keys)
-        if model_def.relations:
-            for rel_name, rel_def in model_def.relations.items():
-                 # Only if one-to-many? For now let's just make sure we don't break
-                 # But we need 'int' fields if they are keys?
-                 # Actually, schemas usually just carry data.
-                 # Let's assume passed in via dictionary.
-                 pass
+    return "\n".join(lines)
 
-        if not has_fields and model_name != "User":
-             lines.append("    pass")
+def generate_model_schemas(model_name: str, model_def: ModelDefinition, incoming: Sequence[Tuple[str, str, str]] = ()) -> List[str]:
+    # incoming: (collection name, child model, child foreign key) for relations other models declare to this one
+    lines = []
+    # Base API Model (Shared properties)
+    lines.append(f"class {model_name}Base(BaseModel):")
+    
+    if model_name == "User":
+         lines.append("    email: str")
 
-        lines.append("")
+    has_fields = False
+    for field_name, field_def in model_def.fields.items():
+        if field_name == "id": continue
+        if model_name == "User" and field_name in ["email", "password", *USER_ACCOUNT_FIELDS]: continue
 
-        # Create Model
-        lines.append(f"class {model_name}Create({model_name}Base):")
-        if model_name == "User":
-            lines.append("    password: str")
+        has_fields = True
+        py_type = TYPE_MAPPING.get(field_def.type.lower(), "str")
+        if not field_def.required:
+            lines.append(f"    {field_name}: Optional[{py_type}] = None")
         else:
-            lines.append("    pass")
-        lines.append("")
+            lines.append(f"    {field_name}: {py_type}")
+    
+    # Add relation helper fields (Foreign Keys)
+    for field_name in (model_def.relations or {}):
+        has_fields = True
+        lines.append(f"    {field_name}: Optional[int] = None")
 
-        # Update Model (All fields optional)
-        # MVP: Just strictly follow base for now, or make all optional
-        lines.append(f"class {model_name}Update({model_name}Base):")
+    if not has_fields and model_name != "User":
+         lines.append("    pass")
+
+    lines.append("")
+
+    # Create Model
+    lines.append(f"class {model_name}Create({model_name}Base):")
+    if model_name == "User":
+        lines.append("    password: str")
+    else:
         lines.append("    pass")
-        lines.append("")
+    lines.append("")
 
-        # Response Model (Includes ID)
-        lines.append(f"class {model_name}Response({model_name}Base):")
-        lines.append("    id: int")
-        lines.append("")
-        lines.append("    class Config:")
-        lines.append("        from_attributes = True")
-        lines.append("")
-        
-    return "\n".join(lines)
+    # Update Model (All fields optional)
+    # MVP: Just strictly follow base for now, or make all optional
+    lines.append(f"class {model_name}Update({model_name}Base):")
+    lines.append("    pass")
+    lines.append("")
+
+    # Patch Model (bulk PATCH item: id plus any subset of fields)
+    lines.append(f"class {model_name}Patch(BaseModel):")
+    lines.append("    id: int")
+    for field_name, field_def in model_def.fields.items():
+        if field_name == "id": continue
+        if model_name == "User" and field_name in ["email", "password", *USER_ACCOUNT_FIELDS]: continue
+        py_type = TYPE_MAPPING.get(field_def.type.lower(), "str")
+        if field_def.required:
+            lines.append(f"    {field_name}: {py_type} = None # May be omitted, not set to null")
+        else:
+            lines.append(f"    {field_name}: Optional[{py_type}] = None")
+    for field_name in (model_def.relations or {}):
+        lines.append(f"    {field_name}: Optional[int] = None")
+    lines.append("")
+
+    # Response Model (Includes ID)
+    lines.append(f"class {model_name}Response({model_name}Base):")
+    lines.append("    id: int")
+    lines.append("")
+    lines.append("    class Config:")
+    lines.append("        from_attributes = True")
+    lines.append("")
+
+    # Nested Response Model: related rows requested with ?include=, one level deep
+    lines.append(f"class {model_name}ResponseNested({model_name}Response):")
+    nested = [(rel_name, f"Optional['{target}Response']") for _, target, rel_name, _ in relation_attributes(model_name, model_def)]
+    nested += [(collection, f"Optional[List['{child}Response']]") for collection, child, _ in incoming]
+    for attribute, annotation in nested:
+        lines.append(f"    {attribute}: {annotation} = None")
+    if not nested:
+        lines.append("    pass")
+    lines.append("")
+    return lines
@@ -1,70 +1,306 @@
-from typing import Dict
+from collections import deque
+from typing import Dict, List, Optional
 from ..schemas import ModelDefinition
+from .models_gen import USER_ACCOUNT_FIELDS
 
-def generate_seed_file(models: Dict[str, ModelDefinition]) -> str:
-    lines = [
-        "from faker import Faker",
-        "from sqlalchemy.orm import Session",
-        "from . import models, database, auth",
-        "",
-        "fake = Faker()",
-        "",
-        "def seed_data():",
-        "    db = database.SessionLocal()",
-        "    try:",
-        "        # Create Admin User",
-        "        if not db.query(models.User).filter(models.User.email == 'admin@example.com').first():",
-        "            admin_user = models.User(",
-        "                email='admin@example.com',",
-        "                hashed_password=auth.get_password_hash('admin123')",
-        "            )",
-        "            db.add(admin_user)",
-        "            print('Created admin user: admin@example.com / admin123')",
-        "",
-        ""
-    ]
-    
-    # Generate seed data for other models
-    for model_name, model_def in models.items():
-        if model_name == "User": continue # Already handled admin user custom logic
-        
-        lines.append(f"        # Seed {model_name}")
-        lines.append(f"        for _ in range(10):")
-        lines.append(f"            item = models.{model_name}(")
-        
-        for field_name, field_def in model_def.fields.items():
-            if field_name == "id": continue
-            
-            # Generate fake data based on type/name
-            fake_val = "fake.word()"
-            t = field_def.type.lower()
-            if t == "string":
-                if "email" in field_name.lower(): fake_val = "fake.email()"
-                elif "name" in field_name.lower(): fake_val = "fake.name()"
-                elif "url" in field_name.lower(): fake_val = "fake.url()"
-                else: fake_val = "fake.text(max_nb_chars=50)"
-            elif t == "int":
-                fake_val = "fake.random_int(min=1, max=100)"
-            elif t == "float":
-                fake_val = "fake.pyfloat(positive=True)"
-            elif t == "boolean":
-                fake_val = "fake.boolean()"
-            elif t == "datetime":
-                fake_val = "fake.date_time_this_year()"
-            
-            lines.append(f"                {field_name}={fake_val},")
-            
-        lines.append(f"            )")
-        lines.append(f"            db.add(item)")
-        lines.append(f"        print('Seeded 10 {model_name} items')")
-        lines.append("")
-
-    lines.append("        db.commit()")
-    lines.append("        print('Seeding complete!')")
-    lines.append("    finally:")
-    lines.append("        db.close()")
+SEED_HEADER = '''"""Fill the database with fake rows, e.g. for load testing.
+
+    python seed.py                                  # 10 rows per model
+    python seed.py --rows 100000 --workers 8        # 100k rows per model, faked on 8 processes
+    python seed.py --rows 1000 --model Post=2000000 # per-model counts
+"""
+import argparse
+import functools
+import multiprocessing
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from faker import Faker
+from sqlalchemy import func, insert, select
+from app import models, database, auth
+
+RUN = uuid.uuid4().hex[:8] # Keeps unique seeded values of separate runs apart
+EPOCH = datetime(2000, 1, 1) # Unique datetime columns count seconds from here
+'''
+
+SEED_RUNNER = '''
+_fake = None
+
+def make_rows(job):
+    """Column values for rows start..start+count of one model; runs in pool workers."""
+    global _fake
+    model_name, start, count, seed = job
+    if _fake is None:
+        _fake = Faker()
+    _fake.seed_instance(seed)
+    factory = ROW_FACTORIES[model_name]
+    return [factory(_fake, n) for n in range(start, start + count)]
+
+@functools.lru_cache(maxsize=None)
+def seeded_password_hash():
+    return auth.get_password_hash("password") # One hash for every fake user: hashing is slow by design
+
+def id_pool(conn, table):
+    \"\"\"Ids to sample foreign keys from; a contiguous block is kept as a range, not fetched.\"\"\"
+    low, high, count = conn.execute(select(func.min(table.c.id), func.max(table.c.id), func.count())).one()
+    if not count:
+        return []
+    if high - low + 1 == count:
+        return range(low, high + 1)
+    return conn.execute(select(table.c.id)).scalars().all()
+
+def seed_admin(conn):
+    table = models.User.__table__
+    if conn.execute(select(table.c.id).where(table.c.email == "admin@example.com")).first() is None:
+        # Fake values for any required columns a custom User model adds
+        admin = {**ROW_FACTORIES["User"](Faker(), 0), "email": "admin@example.com", "is_admin": True}
+        admin["hashed_password"] = auth.get_password_hash("admin123")
+        conn.execute(insert(table).values(**admin))
+        conn.commit()
+        print("Created admin user: admin@example.com / admin123")
+
+def insert_rows(conn, model_name, table):
+    """INSERT for a model; skips rows that repeat a unique index built only from foreign keys."""
+    if model_name in SKIP_CONFLICTS:
+        if conn.dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            return dialect_insert(table).on_conflict_do_nothing()
+        if conn.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            return dialect_insert(table).on_conflict_do_nothing()
+        if conn.dialect.name in ("mysql", "mariadb"):
+            return insert(table).prefix_with("IGNORE")
+    return insert(table)
+
+def seed(conn, counts, chunk_size, workers, seed_value):
+    seed_admin(conn)
+    rng = random.Random(seed_value)
+    pools = {}
+    pool = multiprocessing.get_context("spawn").Pool(workers) if workers > 1 else None
+    try:
+        for model_name in ORDER:
+            table = getattr(models, model_name).__table__
+            total = counts.get(model_name, 0)
+            if total:
+                stmt = insert_rows(conn, model_name, table)
+                # Sequence numbers continue after the current ids, so unique columns stay unique
+                start = (conn.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+                jobs = [
+                    (model_name, start + offset, min(chunk_size, total - offset), seed_value + start + offset)
+                    for offset in range(0, total, chunk_size)
+                ]
+                parents = {
+                    column: pools.setdefault(parent, id_pool(conn, getattr(models, parent).__table__))
+                    for column, parent in FOREIGN_KEYS.get(model_name, {}).items()
+                }
+                self_references = [column for column, parent in FOREIGN_KEYS.get(model_name, {}).items() if parent == model_name]
+                done = 0
+                began = time.perf_counter()
+                chunks = pool.imap(make_rows, jobs) if pool is not None else map(make_rows, jobs)
+                for rows in chunks:
+                    for column, ids in parents.items():
+                        # No parent rows yet (e.g. a self reference on an empty table): leave it NULL
+                        values = rng.choices(ids, k=len(rows)) if ids else [None] * len(rows)
+                        for row, value in zip(rows, values):
+                            row[column] = value
+                    conn.execute(stmt, rows) # executemany: one round trip per chunk
+                    conn.commit()
+                    for column in self_references:
+                        parents[column] = id_pool(conn, table) # Later chunks point at earlier ones
+                    done += len(rows)
+                    elapsed = time.perf_counter() - began
+                    print(f"\\r{model_name}: {done:,}/{total:,} rows, {done / elapsed:,.0f} rows/s", end="", flush=True)
+                print()
+            pools[model_name] = id_pool(conn, table)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Insert fake rows into every model's table.")
+    parser.add_argument("--rows", type=int, default=10, help="rows per model (default 10)")
+    parser.add_argument("--model", action="append", default=[], metavar="NAME=ROWS", help="row count for one model, repeatable")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="rows per INSERT batch and commit")
+    parser.add_argument("--workers", type=int, default=1, help="processes generating fake data (default 1: in process)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for reproducible data")
+    args = parser.parse_args()
+    counts = {model_name: args.rows for model_name in ORDER}
+    for spec in args.model:
+        model_name, _, rows = spec.partition("=")
+        if model_name not in counts or not rows.isdigit():
+            parser.error(f"--model expects NAME=ROWS with NAME one of: {', '.join(ORDER)}")
+        counts[model_name] = int(rows)
+    return counts, max(1, args.chunk_size), args.workers, args.seed
+
+def report(counts, began):
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - began
+    print(f"Seeding complete! {total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+'''
+
+SYNC_MAIN = '''
+def main():
+    counts, chunk_size, workers, seed_value = parse_args()
+    began = time.perf_counter()
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.engine.connect() as conn:
+        seed(conn, counts, chunk_size, workers, seed_value)
+    report(counts, began)
+
+if __name__ == '__main__':
+    main()
+'''
+
+ASYNC_MAIN = '''
+import asyncio
+
+async def main():
+    counts, chunk_size, workers, seed_value = parse_args()
+    began = time.perf_counter()
+    async with database.engine.connect() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+        await conn.commit()
+        # The batch loop is plain synchronous Core code; run_sync drives it on the async connection
+        await conn.run_sync(seed, counts, chunk_size, workers, seed_value)
+    report(counts, began)
+
+if __name__ == '__main__':
+    asyncio.run(main())
+'''
+
+def seed_order(models: Dict[str, ModelDefinition]) -> List[str]:
+    """Models with every parent before its children; cycles fall back to declaration order.
+
+    Kahn's algorithm, linear in models plus relations.
+    """
+    names = list(models) if "User" in models else ["User"] + list(models)
+    children: Dict[str, List[str]] = {name: [] for name in names}
+    waiting = dict.fromkeys(names, 0) # Parents not placed yet
+    for name, model_def in models.items():
+        # dict.fromkeys, not a set: the order must not depend on string hashing
+        for parent in dict.fromkeys((model_def.relations or {}).values()):
+            if parent != name and parent in children:
+                children[parent].append(name)
+                waiting[name] += 1
+
+    ready = deque(name for name in names if waiting[name] == 0)
+    placed = set()
+    order: List[str] = []
+    fallback = 0 # Declaration-order scan position for breaking cycles
+    while len(order) < len(names):
+        if not ready:
+            # Cycle: its first model goes ahead with NULL keys where no parent exists yet
+            while names[fallback] in placed:
+                fallback += 1
+            ready.append(names[fallback])
+        name = ready.popleft()
+        if name in placed:
+            continue # Went ahead to break a cycle, then its last parent arrived
+        placed.add(name)
+        order.append(name)
+        for child in children[name]:
+            waiting[child] -= 1
+            if waiting[child] == 0:
+                ready.append(child)
+    return order
+
+def generate_seed_file(models: Dict[str, ModelDefinition], model_sections: Optional[List[List[str]]] = None, async_mode: bool = False,
+                       order: Optional[List[str]] = None) -> str:
+    # model_sections: pre-rendered generate_model_seed() output per model, in model order
+    # order: seed_order(models), when the caller already computed it
+    # seed.py runs from the project root (python seed.py), so it imports the app package absolutely
+    lines = [SEED_HEADER]
+    if "User" not in models:
+        lines.extend(generate_model_seed("User", ModelDefinition(fields={})))
+
+    if model_sections is None:
+        model_sections = [generate_model_seed(model_name, model_def) for model_name, model_def in models.items()]
+    for section in model_sections:
+        lines.extend(section)
+
+    if order is None:
+        order = seed_order(models)
+    lines.append("ROW_FACTORIES = {")
+    lines.extend(f"    '{model_name}': fake_{model_name.lower()}," for model_name in order)
+    lines.append("}")
     lines.append("")
-    lines.append("if __name__ == '__main__':")
-    lines.append("    seed_data()")
-    
+    lines.append("# Parents before the models whose foreign keys point at them")
+    lines.append(f"ORDER = {order!r}")
+    lines.append("# Model -> {foreign key column: parent model}")
+    lines.append("FOREIGN_KEYS = {")
+    for model_name, model_def in models.items():
+        if model_def.relations:
+            lines.append(f"    '{model_name}': {dict(model_def.relations)!r},")
+    lines.append("}")
+    lines.append("# Models with a unique index that n cannot keep unique: repeats are skipped, so they may get fewer rows")
+    lines.append(f"SKIP_CONFLICTS = {sorted(name for name, model_def in models.items() if conflicting_indexes(name, model_def))!r}")
+    lines.append(SEED_RUNNER)
+    lines.append(ASYNC_MAIN if async_mode else SYNC_MAIN)
     return "\n".join(lines)
+
+def fake_value(field_name: str, field_type: str, unique: bool = False) -> str:
+    # Generate fake data based on type/name; n is the row's sequence number
+    # Unique columns derive their value from n, which never repeats within or across runs
+    t = field_type.lower()
+    if t == "int":
+        return "n" if unique else "fake.random_int(min=1, max=100)"
+    if t == "float":
+        return "float(n)" if unique else "fake.pyfloat(positive=True)"
+    if t == "boolean":
+        return "fake.boolean()" # Two values: see conflicting_indexes
+    if t == "datetime":
+        return "EPOCH + timedelta(seconds=n)" if unique else "fake.date_time_this_year()"
+    if t == "text": value = "fake.paragraph(nb_sentences=5)"
+    elif "email" in field_name.lower(): value = "fake.email()"
+    elif "name" in field_name.lower(): value = "fake.name()"
+    elif "url" in field_name.lower(): value = "fake.url()"
+    elif t == "string": value = "fake.text(max_nb_chars=50)"
+    else: value = "fake.word()"
+    return f"f'{{{value}}}-{{RUN}}-{{n}}'" if unique else value
+
+def unique_columns(model_def: ModelDefinition) -> set:
+    """Fields that are unique on their own or part of a composite unique index."""
+    columns = {name for name, field_def in model_def.fields.items() if field_def.unique}
+    for index in model_def.indexes:
+        if index.unique:
+            columns.update(index.fields)
+    return columns
+
+def conflicting_indexes(model_name: str, model_def: ModelDefinition) -> List[List[str]]:
+    """Unique indexes with no column fake_value() derives from n, e.g. a pair of foreign keys.
+
+    Their values are sampled, so the seeder skips the repeats instead of failing.
+    """
+    def derived(field_name: str) -> bool:
+        if field_name == "id" or (model_name == "User" and field_name == "email"):
+            return True
+        field_def = model_def.fields.get(field_name)
+        return (field_def is not None and field_name not in (model_def.relations or {})
+                and field_def.type.lower() != "boolean")
+
+    fields = [[name] for name, field_def in model_def.fields.items() if field_def.unique]
+    fields.extend(index.fields for index in model_def.indexes if index.unique)
+    return [index_fields for index_fields in fields if not any(derived(name) for name in index_fields)]
+
+def generate_model_seed(model_name: str, model_def: ModelDefinition) -> List[str]:
+    lines = [f"def fake_{model_name.lower()}(fake, n):", "    return {"]
+    if model_name == "User":
+        # Distinct emails without fake.unique, which slows down with every value it has handed out
+        lines.append("        'email': f'user{n}-{RUN}@example.com',")
+        lines.append("        'hashed_password': seeded_password_hash(),")
+        lines.append("        'is_active': True,")
+        lines.append("        'is_admin': False,")
+        lines.append("        'token_version': 0,")
+
+    unique = unique_columns(model_def)
+    for field_name, field_def in model_def.fields.items():
+        if field_name == "id": continue
+        if field_name in (model_def.relations or {}): continue # Sampled from the parent's ids
+        if model_name == "User" and field_name in ["email", "password", "hashed_password", *USER_ACCOUNT_FIELDS]: continue
+        lines.append(f"        '{field_name}': {fake_value(field_name, field_def.type, field_name in unique)},")
+
+    lines.append("    }")
+    lines.append("")
+    return lines
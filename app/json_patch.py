@@ -0,0 +1,153 @@
+"""Minimal RFC 6902 (JSON Patch) implementation for project schema deltas.
+
+Containers are copied on write along each touched path, so the input
+document is never modified and a failing patch leaves nothing half-applied.
+Cost is proportional to the edit, not to the document.
+"""
+from typing import Any, List, Tuple
+
+class JsonPatchError(ValueError):
+    pass
+
+class MalformedPatchError(JsonPatchError):
+    """An operation lacks a member RFC 6902 requires for it (the patch document itself is invalid)."""
+
+def parse_pointer(pointer: str) -> List[str]:
+    """Split an RFC 6901 JSON Pointer into unescaped reference tokens."""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [t.replace("~1", "/").replace("~0", "~") for t in pointer[1:].split("/")]
+
+def _copy(container: Any) -> Any:
+    if isinstance(container, dict):
+        return dict(container)
+    if isinstance(container, list):
+        return list(container)
+    raise JsonPatchError("Path traverses a scalar value")
+
+def _list_index(container: list, token: str, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    limit = len(container) + (1 if allow_end else 0)
+    if index >= limit:
+        raise JsonPatchError(f"Array index out of range: {index}")
+    return index
+
+def _get(doc: Any, tokens: List[str]) -> Any:
+    node = doc
+    for token in tokens:
+        if isinstance(node, dict):
+            if token not in node:
+                raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_list_index(node, token, allow_end=False)]
+        else:
+            raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+    return node
+
+def _parent_for_write(doc: Any, tokens: List[str]) -> Tuple[Any, Any]:
+    """Copy the containers along `tokens[:-1]`; return (new_doc, parent_of_target)."""
+    root = _copy(doc)
+    node = root
+    for token in tokens[:-1]:
+        if isinstance(node, dict):
+            if token not in node:
+                raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+            child = _copy(node[token])
+            node[token] = child
+        else:
+            index = _list_index(node, token, allow_end=False)
+            child = _copy(node[index])
+            node[index] = child
+        node = child
+    return root, node
+
+def _add(doc: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    root, parent = _parent_for_write(doc, tokens)
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    else:
+        parent.insert(_list_index(parent, tokens[-1], allow_end=True), value)
+    return root
+
+def _remove(doc: Any, tokens: List[str]) -> Any:
+    if not tokens:
+        raise JsonPatchError("Cannot remove the document root")
+    root, parent = _parent_for_write(doc, tokens)
+    if isinstance(parent, dict):
+        if tokens[-1] not in parent:
+            raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+        del parent[tokens[-1]]
+    else:
+        del parent[_list_index(parent, tokens[-1], allow_end=False)]
+    return root
+
+def _replace(doc: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    _get(doc, tokens) # Target must exist
+    root, parent = _parent_for_write(doc, tokens)
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    else:
+        parent[_list_index(parent, tokens[-1], allow_end=False)] = value
+    return root
+
+def check_operations(operations: List[dict]):
+    """Reject operations missing a member their op requires.
+
+    A `value` that is present but null is a null value; add, replace and test
+    without one are errors rather than writes of null.
+    """
+    for operation in operations:
+        op = operation.get("op")
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise MalformedPatchError(f"'{op}' requires 'value'")
+        if op in ("move", "copy") and operation.get("from") is None:
+            raise MalformedPatchError(f"'{op}' requires 'from'")
+
+def apply_patch(doc: Any, operations: List[dict]) -> Any:
+    """Apply RFC 6902 operations (dicts with op/path/value/from) and return the new document."""
+    check_operations(operations)
+    for operation in operations:
+        op = operation.get("op")
+        tokens = parse_pointer(operation.get("path", ""))
+        if op == "add":
+            doc = _add(doc, tokens, operation["value"])
+        elif op == "remove":
+            doc = _remove(doc, tokens)
+        elif op == "replace":
+            doc = _replace(doc, tokens, operation["value"])
+        elif op in ("move", "copy"):
+            source = parse_pointer(operation["from"])
+            if op == "move" and tokens[:len(source)] == source and tokens != source:
+                raise JsonPatchError("Cannot move a value into one of its children")
+            value = _get(doc, source)
+            if op == "move":
+                doc = _remove(doc, source)
+            doc = _add(doc, tokens, value)
+        elif op == "test":
+            if _get(doc, tokens) != operation["value"]:
+                raise JsonPatchError(f"Test failed at {operation.get('path')}")
+        else:
+            raise JsonPatchError(f"Unknown operation: {op!r}")
+    return doc
+
+def touched_paths(operations: List[dict]) -> List[List[str]]:
+    """Every pointer (as tokens) an operation list writes to."""
+    paths = []
+    for operation in operations:
+        if operation.get("op") == "test":
+            continue
+        paths.append(parse_pointer(operation.get("path", "")))
+        if operation.get("op") == "move" and operation.get("from") is not None:
+            paths.append(parse_pointer(operation["from"]))
+    return paths
@@ -1,12 +1,18 @@
-from fastapi import FastAPI, HTTPException, Response, Depends, status
+from fastapi import FastAPI, HTTPException, Request, Response, Depends, status
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from typing import List
-from . import storage, schemas, builder_auth
-from .generator.main_gen import generate_project_zip
+from typing import List, Optional
+import os
+from . import storage, async_storage, schemas, builder_auth, profiler, telemetry
+from .executors import Overloaded, iterate_io, run_io
+from .generator.main_gen import generate_project_zip, iter_project_zip
+from .generator.cache import schema_fingerprint, zip_cache
+from .generator.diff import diff_project_files, iter_diff_zip, unified_patch
+from .json_patch import JsonPatchError, MalformedPatchError
 
 app = FastAPI(title="Low-Code Backend Builder")
+app.add_middleware(telemetry.MetricsMiddleware)
 
 # Mount static files for the frontend
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -15,6 +21,10 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 def startup_event():
     storage.init_storage()
 
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 @app.get("/")
 def read_root():
     return RedirectResponse(url="/static/index.html")
@@ -22,17 +32,17 @@ def read_root():
 # --- Auth APIs ---
 
 @app.post("/api/auth/register", response_model=schemas.BuilderUserResponse)
-def register(user: schemas.BuilderUserCreate):
+async def register(user: schemas.BuilderUserCreate):
     try:
-        hashed_password = builder_auth.get_password_hash(user.password)
-        return storage.create_user(user, hashed_password)
+        hashed_password = await builder_auth.get_password_hash_async(user.password)
+        return await async_storage.create_user(user, hashed_password)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/api/auth/token", response_model=builder_auth.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = storage.get_user_by_email(form_data.username)
-    if not user or not builder_auth.verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await async_storage.get_user_by_email(form_data.username)
+    if not user or not await builder_auth.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -42,58 +52,156 @@ def login(form_data: OAuth2PasswordRequestForm = Depends()):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/api/auth/me", response_model=schemas.BuilderUserResponse)
-def read_users_me(current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
+async def read_users_me(current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
     return current_user
 
+@app.get("/api/auth/token-cache")
+async def token_cache_stats(current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
+    return builder_auth.token_cache.stats()
+
+@app.get("/api/metrics")
+async def metrics_api(current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
+    # Request latency per route, stage spans (storage calls, generation steps, deflate) and cache counters
+    return telemetry.metrics.snapshot()
+
 # --- Project APIs (Protected) ---
 
 @app.post("/api/projects", response_model=schemas.ProjectResponse)
-def create_project_api(project: schemas.ProjectCreate, current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
-    return storage.create_project(project, current_user.id)
+async def create_project_api(project: schemas.ProjectCreate, current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
+    return await async_storage.create_project(project, current_user.id)
 
 @app.get("/api/projects", response_model=List[schemas.ProjectResponse])
-def list_projects_api(current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
-    return storage.list_projects(current_user.id)
+async def list_projects_api(current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
+    return await async_storage.list_projects(current_user.id)
 
 @app.get("/api/projects/{project_id}", response_model=schemas.ProjectResponse)
-def get_project_api(project_id: str, current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
-    project = storage.get_project(project_id)
+async def get_project_api(project_id: str, current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
+    project = await async_storage.get_project(project_id)
     if not project or project.owner_id != current_user.id:
         raise HTTPException(status_code=404, detail="Project not found")
     return project
 
 @app.put("/api/projects/{project_id}", response_model=schemas.ProjectResponse)
-def update_project_api(project_id: str, project: schemas.ProjectUpdate, current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
-    existing = storage.get_project(project_id)
-    if not existing or existing.owner_id != current_user.id:
+async def update_project_api(project_id: str, project: schemas.ProjectUpdate, current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
+    if await async_storage.get_project_owner(project_id) != current_user.id:
         raise HTTPException(status_code=404, detail="Project not found")
         
-    updated = storage.update_project(project_id, project)
+    try:
+        updated = await async_storage.update_project(project_id, project)
+    except storage.RevisionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if updated is None: # Deleted since the ownership check
+        raise HTTPException(status_code=404, detail="Project not found")
     return updated
 
+@app.patch("/api/projects/{project_id}", response_model=schemas.ProjectPatchResult)
+async def patch_project_api(project_id: str, patch: schemas.ProjectPatch, current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
+    # Ownership check without loading the schema: cost should track the edit size
+    if await async_storage.get_project_owner(project_id) != current_user.id:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    try:
+        result = await async_storage.patch_project(project_id, patch)
+    except storage.RevisionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except MalformedPatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JsonPatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return result
+
 @app.delete("/api/projects/{project_id}")
-def delete_project_api(project_id: str, current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
-    existing = storage.get_project(project_id)
-    if not existing or existing.owner_id != current_user.id:
+async def delete_project_api(project_id: str, current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
+    if await async_storage.get_project_owner(project_id) != current_user.id:
         raise HTTPException(status_code=404, detail="Project not found")
         
-    storage.delete_project(project_id)
+    await async_storage.delete_project(project_id)
     return {"status": "success"}
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in ("*", etag):
+            return True
+    return False
+
+def _profile_generation(project_id: str, project_schema: schemas.ProjectSchema):
+    # Runs on one I/O thread, so the sampler and the span trace both see the whole generation
+    with telemetry.collect_spans() as spans:
+        zip_bytes, path = profiler.profile_call(f"generate-{project_id}", generate_project_zip, project_schema)
+    return zip_bytes, spans, path
+
 @app.get("/api/projects/{project_id}/generate")
-def generate_project_api(project_id: str, current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
-    project = storage.get_project(project_id)
+async def generate_project_api(project_id: str, request: Request, profile: bool = False, current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
+    project = await async_storage.get_project(project_id)
     if not project or project.owner_id != current_user.id:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    zip_bytes = generate_project_zip(project.schema_data)
-    
-    return Response(
-        content=zip_bytes,
+    # Archives are content-addressed: same schema + same generator => same bytes
+    key = schema_fingerprint(project.schema_data)
+    etag = f'"{key}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+    }
+    if profile:
+        # Always generates (no 304, no archive cache): the point is to see where the time goes
+        if not profiler.PROFILING_ENABLED:
+            raise HTTPException(status_code=403, detail="Profiling is disabled, start the builder with BUILDER_PROFILING=1")
+        try:
+            zip_bytes, spans, path = await run_io(_profile_generation, project_id, project.schema_data)
+        except profiler.ProfilerBusy as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        headers["Content-Disposition"] = f"attachment; filename=project_{project_id}.zip"
+        headers["Server-Timing"] = telemetry.server_timing(spans)
+        headers["X-Profile"] = os.path.basename(path)
+        return Response(content=zip_bytes, media_type="application/zip", headers=headers)
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        telemetry.metrics.inc("zip_cache", "not_modified")
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = f"attachment; filename=project_{project_id}.zip"
+
+    zip_bytes = await run_io(zip_cache.get, key)
+    if zip_bytes is not None:
+        telemetry.metrics.inc("zip_cache", "hit")
+        return Response(content=zip_bytes, media_type="application/zip", headers=headers)
+    telemetry.metrics.inc("zip_cache", "miss")
+
+    # Cache miss: stream entries as they are deflated instead of buffering the archive
+    return StreamingResponse(
+        iterate_io(zip_cache.stream_through(key, iter_project_zip(project.schema_data))),
         media_type="application/zip",
-        headers={"Content-Disposition": f"attachment; filename=project_{project_id}.zip"}
+        headers=headers
     )
 
+@app.get("/api/projects/{project_id}/generate/diff")
+async def generate_diff_api(project_id: str, since: int, format: str = "zip", current_user: schemas.BuilderUser = Depends(builder_auth.get_current_user)):
+    project = await async_storage.get_project(project_id)
+    if not project or project.owner_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if format not in ("zip", "patch"):
+        raise HTTPException(status_code=400, detail="format must be 'zip' or 'patch'")
+
+    old_schema = await async_storage.get_project_revision(project_id, since)
+    if old_schema is None:
+        raise HTTPException(status_code=410, detail=f"Revision {since} is no longer available, download the full project")
+
+    diff = await run_io(diff_project_files, old_schema, project.schema_data)
+    headers = {"X-Project-Revision": str(project.revision)}
+    if format == "patch":
+        return Response(content=await run_io(unified_patch, diff), media_type="text/x-diff", headers=headers)
+
+    headers["Content-Disposition"] = f"attachment; filename=project_{project_id}_{since}-{project.revision}.zip"
+    return StreamingResponse(iterate_io(iter_diff_zip(diff, since, project.revision)), media_type="application/zip", headers=headers)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
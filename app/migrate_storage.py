@@ -0,0 +1,50 @@
+"""Import legacy storage/<project_id>.json files into the SQLite project store.
+
+Usage:
+    python -m app.migrate_storage [--storage-dir storage] [--db storage/projects.db] [--overwrite]
+"""
+import argparse
+import json
+import os
+from typing import Tuple
+from .project_store import SqliteProjectStore
+from .schemas import ProjectResponse
+
+def import_json_projects(store: SqliteProjectStore, directory: str, overwrite: bool = False) -> Tuple[int, int]:
+    """Copy every project file in `directory` into `store`. Returns (imported, skipped)."""
+    imported = skipped = 0
+    if not os.path.isdir(directory):
+        return imported, skipped
+
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".json") or filename == "users.json":
+            continue
+        try:
+            with open(os.path.join(directory, filename), "r") as f:
+                data = ProjectResponse(**json.load(f)).dict()
+        except (json.JSONDecodeError, ValueError, TypeError):
+            skipped += 1 # Corrupt or not a project file
+            continue
+
+        if not overwrite and store.exists(data["id"]):
+            skipped += 1
+            continue
+        store.insert(data, replace=overwrite)
+        imported += 1
+
+    return imported, skipped
+
+def main():
+    parser = argparse.ArgumentParser(description="Import JSON project files into SQLite")
+    parser.add_argument("--storage-dir", default="storage")
+    parser.add_argument("--db", default=None, help="Defaults to <storage-dir>/projects.db")
+    parser.add_argument("--overwrite", action="store_true", help="Replace projects that already exist in the database")
+    args = parser.parse_args()
+
+    store = SqliteProjectStore(args.db or os.path.join(args.storage_dir, "projects.db"))
+    store.init()
+    imported, skipped = import_json_projects(store, args.storage_dir, overwrite=args.overwrite)
+    print(f"Imported {imported} project(s), skipped {skipped}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Opt-in sampling profiler for single builder requests.
+
+With BUILDER_PROFILING=1, GET /api/projects/{id}/generate?profile=1 generates the
+archive on one thread while a sampler records that thread's stack, and writes the
+result to BUILDER_PROFILE_DIR in collapsed-stack ("folded") format. Open it with
+speedscope or flamegraph.pl.
+"""
+import os
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+PROFILING_ENABLED = os.environ.get("BUILDER_PROFILING", "0") == "1"
+PROFILE_DIR = os.environ.get("BUILDER_PROFILE_DIR", os.path.join("storage", "profiles"))
+PROFILE_INTERVAL_MS = float(os.environ.get("BUILDER_PROFILE_INTERVAL_MS", "1"))
+
+# The switch interval a profile lowers is process-wide, so only one profile runs at a time
+_profiling = threading.Lock()
+
+class ProfilerBusy(RuntimeError):
+    """Another profile is still running."""
+
+class SamplingProfiler:
+    """Samples one thread's Python stack every `interval` seconds from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._switch_interval = sys.getswitchinterval()
+
+    def __enter__(self) -> "SamplingProfiler":
+        # The sampler needs the GIL to look at the other thread; hand it over at least as often as we sample
+        sys.setswitchinterval(min(self._switch_interval, self.interval))
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[self._stack(frame)] += 1
+
+    @staticmethod
+    def _stack(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def folded(self) -> str:
+        """One `outer;...;inner count` line per distinct stack, most frequent first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+def profile_call(name: str, func: Callable[..., T], *args: Any) -> Tuple[T, str]:
+    """Run func(*args) on this thread under the sampler; returns (result, profile path).
+
+    Raises ProfilerBusy instead of waiting when another profile is running.
+    """
+    if not _profiling.acquire(blocking=False):
+        raise ProfilerBusy("Another profile is running, retry when it is done")
+    try:
+        with SamplingProfiler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000) as profiler:
+            result = func(*args)
+    finally:
+        _profiling.release()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{name}.folded")
+    with open(path, "w") as f:
+        f.write(profiler.folded())
+    return result, path
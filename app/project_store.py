@@ -0,0 +1,251 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Callable, List, Optional
+from .fsutil import atomic_write_json
+from .telemetry import span
+
+# Called with the stored project dict, returns the dict to write back
+Mutator = Callable[[dict], dict]
+
+# Project persistence backends. Both stores speak plain dicts shaped like
+# ProjectResponse; storage.py owns the pydantic conversion.
+
+class JsonProjectStore:
+    """Legacy layout: one <project_id>.json file per project in STORAGE_DIR.
+
+    Past schemas live in history/<project_id>/<revision>.json.
+    """
+
+    def __init__(self, directory: str, history_limit: int = 50):
+        self.directory = directory
+        self.history_limit = history_limit
+
+    def _path(self, project_id: str) -> str:
+        return os.path.join(self.directory, f"{project_id}.json")
+
+    def _history_dir(self, project_id: str) -> str:
+        return os.path.join(self.directory, "history", project_id)
+
+    def _record_revision(self, data: dict):
+        history_dir = self._history_dir(data["id"])
+        os.makedirs(history_dir, exist_ok=True)
+        revision = data.get("revision", 0)
+        atomic_write_json(os.path.join(history_dir, f"{revision}.json"), data["schema_data"], indent=None)
+        expired = os.path.join(history_dir, f"{revision - self.history_limit}.json")
+        if os.path.exists(expired):
+            os.remove(expired)
+
+    def get_revision(self, project_id: str, revision: int) -> Optional[dict]:
+        path = os.path.join(self._history_dir(project_id), f"{revision}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def init(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    def insert(self, data: dict):
+        atomic_write_json(self._path(data["id"]), data)
+        self._record_revision(data)
+
+    def get(self, project_id: str) -> Optional[dict]:
+        path = self._path(project_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            text = f.read()
+        with span("store.decode"):
+            return json.loads(text)
+
+    def get_owner(self, project_id: str) -> Optional[str]:
+        data = self.get(project_id)
+        return data.get("owner_id") if data else None
+
+    def list_by_owner(self, owner_id: str) -> List[dict]:
+        # No index in this layout: every project file has to be opened
+        projects = []
+        if not os.path.exists(self.directory):
+            return []
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".json") and filename != "users.json":
+                try:
+                    with open(os.path.join(self.directory, filename), "r") as f:
+                        data = json.load(f)
+                except json.JSONDecodeError:
+                    continue # Skip corrupt files
+                if data.get("owner_id") == owner_id:
+                    projects.append(data)
+        projects.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+        return projects
+
+    def update(self, project_id: str, mutate: Mutator) -> Optional[dict]:
+        # Caller holds the project lock; the rename makes the write crash-safe
+        current = self.get(project_id)
+        if current is None:
+            return None
+        previous_revision = current.get("revision") # Read first: mutators may edit `current` in place
+        data = mutate(current)
+        atomic_write_json(self._path(project_id), data)
+        if data.get("revision") != previous_revision:
+            self._record_revision(data)
+        return data
+
+    def delete(self, project_id: str) -> bool:
+        path = self._path(project_id)
+        if os.path.exists(path):
+            os.remove(path)
+            shutil.rmtree(self._history_dir(project_id), ignore_errors=True)
+            return True
+        return False
+
+
+class SqliteProjectStore:
+    """Projects in a single SQLite file, indexed by (owner_id, created_at).
+
+    The last `history_limit` schemas of each project are kept in project_revisions.
+    """
+
+    COLUMNS = ("id", "owner_id", "name", "created_at", "updated_at", "revision", "schema_data")
+
+    def __init__(self, db_path: str, history_limit: int = 50):
+        self.db_path = db_path
+        self.history_limit = history_limit
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections are bound to their creating thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def init(self):
+        directory = os.path.dirname(self.db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS projects ("
+                " id TEXT PRIMARY KEY,"
+                " owner_id TEXT,"
+                " name TEXT NOT NULL,"
+                " created_at TEXT NOT NULL,"
+                " updated_at TEXT,"
+                " revision INTEGER NOT NULL DEFAULT 0,"
+                " schema_data TEXT NOT NULL)"
+            )
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(projects)")}
+            if "revision" not in columns: # Databases created before revisions existed
+                conn.execute("ALTER TABLE projects ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS project_revisions ("
+                " project_id TEXT NOT NULL,"
+                " revision INTEGER NOT NULL,"
+                " schema_data TEXT NOT NULL,"
+                " PRIMARY KEY (project_id, revision))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_projects_owner_created"
+                " ON projects (owner_id, created_at)"
+            )
+
+    def _row_to_dict(self, row: sqlite3.Row) -> dict:
+        data = dict(row)
+        with span("store.decode"):
+            data["schema_data"] = json.loads(data["schema_data"])
+        return data
+
+    def _row_values(self, data: dict) -> tuple:
+        return (
+            data["id"],
+            data.get("owner_id"),
+            data["name"],
+            data["created_at"],
+            data.get("updated_at"),
+            data.get("revision", 0),
+            json.dumps(data["schema_data"]),
+        )
+
+    def _record_revision(self, conn: sqlite3.Connection, data: dict):
+        revision = data.get("revision", 0)
+        conn.execute(
+            "INSERT OR REPLACE INTO project_revisions (project_id, revision, schema_data) VALUES (?, ?, ?)",
+            (data["id"], revision, json.dumps(data["schema_data"])),
+        )
+        conn.execute(
+            "DELETE FROM project_revisions WHERE project_id = ? AND revision <= ?",
+            (data["id"], revision - self.history_limit),
+        )
+
+    def insert(self, data: dict, replace: bool = False):
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        placeholders = ", ".join("?" for _ in self.COLUMNS)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                f"{verb} INTO projects ({', '.join(self.COLUMNS)}) VALUES ({placeholders})",
+                self._row_values(data),
+            )
+            self._record_revision(conn, data)
+
+    def get_revision(self, project_id: str, revision: int) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT schema_data FROM project_revisions WHERE project_id = ? AND revision = ?",
+            (project_id, revision),
+        ).fetchone()
+        return json.loads(row["schema_data"]) if row else None
+
+    def exists(self, project_id: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM projects WHERE id = ?", (project_id,)).fetchone()
+        return row is not None
+
+    def get(self, project_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM projects WHERE id = ?", (project_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def get_owner(self, project_id: str) -> Optional[str]:
+        row = self._conn().execute("SELECT owner_id FROM projects WHERE id = ?", (project_id,)).fetchone()
+        return row["owner_id"] if row else None
+
+    def list_by_owner(self, owner_id: str) -> List[dict]:
+        rows = self._conn().execute(
+            "SELECT * FROM projects WHERE owner_id = ? ORDER BY created_at DESC",
+            (owner_id,),
+        ).fetchall()
+        return [self._row_to_dict(r) for r in rows]
+
+    def update(self, project_id: str, mutate: Mutator) -> Optional[dict]:
+        conn = self._conn()
+        # IMMEDIATE takes the database write lock up front, so the
+        # read-modify-write cannot interleave with another worker's
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            row = conn.execute("SELECT * FROM projects WHERE id = ?", (project_id,)).fetchone()
+            if row is None:
+                return None
+            data = mutate(self._row_to_dict(row))
+            conn.execute(
+                "UPDATE projects SET owner_id = ?, name = ?, created_at = ?, updated_at = ?, revision = ?, schema_data = ?"
+                " WHERE id = ?",
+                self._row_values(data)[1:] + (project_id,),
+            )
+            if data.get("revision") != row["revision"]:
+                self._record_revision(conn, data)
+        return data
+
+    def delete(self, project_id: str) -> bool:
+        conn = self._conn()
+        with conn:
+            cur = conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+            conn.execute("DELETE FROM project_revisions WHERE project_id = ?", (project_id,))
+        return cur.rowcount > 0
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Dict, List, Optional, Any
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, List, Literal, Optional, Any
 from datetime import datetime
 
 # --- Builder User Schemas ---
@@ -24,14 +24,51 @@ class BuilderUserResponse(BuilderUserBase):
 class FieldDefinition(BaseModel):
     type: str = Field(..., description="Data type: string, int, boolean, etc.")
     required: bool = Field(True, description="Is the field required?")
+    index: bool = Field(False, description="Create a database index on this column")
+    unique: bool = Field(False, description="Reject duplicate values (backed by a unique index)")
+
+class IndexDefinition(BaseModel):
+    fields: List[str] = Field(..., min_length=1, description="Columns in index order (fields, relation keys or id)")
+    unique: bool = False
+    name: Optional[str] = None # Defaults to ix_/uq_<table>_<columns>
 
 class ModelDefinition(BaseModel):
     fields: Dict[str, FieldDefinition]
     relations: Optional[Dict[str, str]] = None  # Generic relation definition for MVP
+    indexes: List[IndexDefinition] = Field(default_factory=list) # Composite indexes / unique constraints
+
+    @model_validator(mode="after")
+    def check_index_columns(self):
+        columns = {"id", *self.fields, *(self.relations or {})}
+        for index in self.indexes:
+            unknown = [name for name in index.fields if name not in columns]
+            if unknown:
+                raise ValueError(f"Index refers to unknown columns: {', '.join(unknown)}")
+        return self
+
+class DatabaseSettings(BaseModel):
+    mode: Literal["sync", "async"] = Field("sync", description="sync: Session + def endpoints, async: AsyncSession + async def endpoints")
+
+class CacheSettings(BaseModel):
+    enabled: bool = Field(False, description="Generate a read-through response cache for GET endpoints")
+    ttl_seconds: int = Field(30, ge=1, description="Default lifetime of a cached response")
+    max_entries: int = Field(10000, ge=1, description="Default size of the in-process cache")
+
+class AuthSettings(BaseModel):
+    stateless: bool = Field(False, description="Resolve the caller from token claims instead of a user query per request")
+    user_cache_ttl_seconds: int = Field(60, ge=1, description="How long a worker trusts its copy of a user row (revocation delay)")
+
+class ObservabilitySettings(BaseModel):
+    enabled: bool = Field(False, description="Generate Prometheus /metrics, per-request SQL timing and a slow-query log")
+    slow_query_ms: int = Field(200, ge=1, description="Default threshold above which a query is logged as slow")
 
 class ProjectSchema(BaseModel):
     models: Dict[str, ModelDefinition]
     apis: Dict[str, Dict[str, str]] = Field(default_factory=dict) # e.g. {"User": {"create": "public"}}
+    database: DatabaseSettings = Field(default_factory=DatabaseSettings)
+    cache: CacheSettings = Field(default_factory=CacheSettings)
+    auth: AuthSettings = Field(default_factory=AuthSettings)
+    observability: ObservabilitySettings = Field(default_factory=ObservabilitySettings)
 
 # --- API Request/Response Models ---
 
@@ -44,8 +81,25 @@ class ProjectResponse(BaseModel):
     name: str
     created_at: str
     updated_at: Optional[str] = None
+    revision: int = 0 # Bumped on every write, used for optimistic concurrency
     schema_data: ProjectSchema
 
 class ProjectUpdate(BaseModel):
     name: Optional[str] = None
     schema_data: Optional[ProjectSchema] = None
+    revision: Optional[int] = None # If set, rejected unless it matches the stored revision
+
+class PatchOperation(BaseModel):
+    op: str = Field(..., description="add, remove, replace, move, copy or test")
+    path: str = Field(..., description="JSON Pointer into schema_data, e.g. /models/Post/fields/title")
+    value: Any = None
+    from_: Optional[str] = Field(None, alias="from")
+
+class ProjectPatch(BaseModel):
+    revision: int = Field(..., description="Revision the operations were computed against")
+    operations: List[PatchOperation]
+
+class ProjectPatchResult(BaseModel):
+    id: str
+    revision: int
+    updated_at: Optional[str] = None
@@ -1,12 +1,48 @@
 import json
 import os
+import threading
+import time
 import uuid
 from datetime import datetime
-from typing import List, Optional
-from .schemas import ProjectCreate, ProjectResponse, ProjectSchema, ProjectUpdate, BuilderUser, BuilderUserCreate
+from typing import Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from .schemas import (
+    ProjectCreate, ProjectResponse, ProjectSchema, ProjectUpdate, ProjectPatch, ProjectPatchResult,
+    ModelDefinition, DatabaseSettings, CacheSettings, AuthSettings, ObservabilitySettings, BuilderUser, BuilderUserCreate
+)
+from .json_patch import JsonPatchError, apply_patch, check_operations, touched_paths
+from .project_store import JsonProjectStore, SqliteProjectStore, Mutator
+from .fsutil import atomic_write_json, KeyedLock
+from .telemetry import record_span, span, timed
 
 STORAGE_DIR = "storage"
 USERS_FILE = os.path.join(STORAGE_DIR, "users.json")
+PROJECTS_DB = os.path.join(STORAGE_DIR, "projects.db")
+STORAGE_BACKEND = os.environ.get("BUILDER_STORAGE_BACKEND", "sqlite")
+REVISION_HISTORY = int(os.environ.get("BUILDER_REVISION_HISTORY", "50")) # Past schemas kept per project
+LOCK_DIR = os.path.join(STORAGE_DIR, ".locks")
+# How long the first save of a burst waits for more saves to the same project before writing
+SAVE_COALESCE_MS = float(os.environ.get("BUILDER_SAVE_COALESCE_MS", "20"))
+
+# Serializes writers per project (threads via a lock, workers via flock)
+_locks = KeyedLock(LOCK_DIR)
+
+# Process-wide email -> user index over users.json. It is rebuilt only when
+# the file's (mtime, size) signature changes, e.g. after another worker writes it.
+# The signature is checked at most every USERS_RECHECK_SECONDS; this worker's own
+# registrations update the index directly.
+USERS_RECHECK_SECONDS = float(os.environ.get("BUILDER_USERS_RECHECK_SECONDS", "1"))
+_users_lock = threading.RLock()
+_users_by_email: Dict[str, BuilderUser] = {}
+_users_signature: Optional[Tuple[int, int]] = None
+_users_checked_at = float("-inf") # time.monotonic() of the last signature check
+
+def _users_file_signature() -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(USERS_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
 
 def _load_users() -> List[BuilderUser]:
     if not os.path.exists(USERS_FILE):
@@ -16,37 +52,99 @@ def _load_users() -> List[BuilderUser]:
         return [BuilderUser(**u) for u in data]
 
 def _save_users(users: List[BuilderUser]):
-    with open(USERS_FILE, "w") as f:
-        json.dump([u.dict() for u in users], f, indent=2)
+    atomic_write_json(USERS_FILE, [u.dict() for u in users])
+
+def fresh_user_index() -> Optional[Dict[str, BuilderUser]]:
+    """The index if its signature was checked recently, else None. Never blocks or touches the disk.
+
+    Users that did not change keep their BuilderUser object across reloads, so
+    `index.get(user.email) is user` tells whether a held user is still current.
+    """
+    if time.monotonic() - _users_checked_at < USERS_RECHECK_SECONDS:
+        return _users_by_email
+    return None
 
+def user_index(max_age: Optional[float] = None) -> Dict[str, BuilderUser]:
+    """The index, re-checking users.json if it was last checked more than `max_age` seconds ago."""
+    global _users_by_email, _users_signature, _users_checked_at
+    if max_age is None:
+        max_age = USERS_RECHECK_SECONDS
+    if time.monotonic() - _users_checked_at < max_age:
+        return _users_by_email
+    signature = _users_file_signature()
+    if signature == _users_signature:
+        _users_checked_at = time.monotonic()
+        return _users_by_email
+    with _users_lock:
+        signature = _users_file_signature()
+        if signature != _users_signature:
+            previous = _users_by_email
+            index = {}
+            for u in _load_users():
+                kept = previous.get(u.email)
+                index[u.email] = kept if kept == u else u
+            _users_by_email = index
+            _users_signature = signature
+        _users_checked_at = time.monotonic()
+        return _users_by_email
+
+@timed("storage.create_user")
 def create_user(user: BuilderUserCreate, hashed_password: str) -> BuilderUser:
-    users = _load_users()
-    if any(u.email == user.email for u in users):
-        raise ValueError("Email already registered")
-        
-    new_user = BuilderUser(
-        id=str(uuid.uuid4()),
-        email=user.email,
-        hashed_password=hashed_password
-    )
-    users.append(new_user)
-    _save_users(users)
+    global _users_by_email, _users_signature, _users_checked_at
+    with _users_lock, _locks("users"):
+        index = user_index(max_age=0) # Under the file lock: see every other worker's registrations
+        if user.email in index:
+            raise ValueError("Email already registered")
+
+        new_user = BuilderUser(
+            id=str(uuid.uuid4()),
+            email=user.email,
+            hashed_password=hashed_password
+        )
+        updated = dict(index)
+        updated[new_user.email] = new_user
+        _save_users(list(updated.values()))
+        _users_by_email = updated
+        _users_signature = _users_file_signature()
+        _users_checked_at = time.monotonic()
     return new_user
 
+@timed("storage.get_user_by_email")
 def get_user_by_email(email: str) -> Optional[BuilderUser]:
-    users = _load_users()
-    for u in users:
-        if u.email == email:
-            return u
-    return None
+    user = user_index().get(email)
+    if user is None:
+        # Not known here: maybe registered by another worker since the last check
+        user = user_index(max_age=0).get(email)
+    return user
+
+_store = None
 
-def _get_project_path(project_id: str) -> str:
-    return os.path.join(STORAGE_DIR, f"{project_id}.json")
+def get_store():
+    """Return the configured project backend ("sqlite" by default, "json" for the legacy layout)."""
+    global _store
+    if _store is None:
+        if STORAGE_BACKEND == "json":
+            _store = JsonProjectStore(STORAGE_DIR, REVISION_HISTORY)
+        else:
+            _store = SqliteProjectStore(PROJECTS_DB, REVISION_HISTORY)
+    return _store
 
 def init_storage():
     if not os.path.exists(STORAGE_DIR):
         os.makedirs(STORAGE_DIR)
 
+    store = get_store()
+    if isinstance(store, SqliteProjectStore):
+        is_new = not os.path.exists(store.db_path)
+        store.init()
+        if is_new:
+            # First start on SQLite: bring over projects saved by the JSON backend
+            from .migrate_storage import import_json_projects
+            import_json_projects(store, STORAGE_DIR)
+    else:
+        store.init()
+
+@timed("storage.create_project")
 def create_project(project_in: ProjectCreate, owner_id: str) -> ProjectResponse:
     project_id = str(uuid.uuid4())
     now = datetime.now().isoformat()
@@ -59,68 +157,204 @@ def create_project(project_in: ProjectCreate, owner_id: str) -> ProjectResponse:
         "name": project_in.name,
         "created_at": now,
         "updated_at": now, # Added updated_at
+        "revision": 0,
         "schema_data": empty_schema.dict(),
         "owner_id": owner_id
     }
     
-    with open(_get_project_path(project_id), "w") as f:
-        json.dump(project_data, f, indent=2)
+    get_store().insert(project_data)
         
     return ProjectResponse(**project_data)
 
 def list_projects(owner_id: str) -> List[ProjectResponse]:
-    projects = []
-    if not os.path.exists(STORAGE_DIR):
-        return []
-        
-    for filename in os.listdir(STORAGE_DIR):
-        if filename.endswith(".json") and filename != "users.json":
-            filepath = os.path.join(STORAGE_DIR, filename)
-            try:
-                with open(filepath, "r") as f:
-                    data = json.load(f)
-                    # Filter: Only show if owner matches
-                    if data.get("owner_id") == owner_id:
-                        projects.append(ProjectResponse(**data))
-            except json.JSONDecodeError:
-                continue # Skip corrupt files
-                
-    # Sort by created_at desc
-    projects.sort(key=lambda x: x.created_at, reverse=True)
-    return projects
+    # Backend returns rows already sorted by created_at desc
+    with span("storage.list_projects.read"):
+        rows = get_store().list_by_owner(owner_id)
+    with span("storage.list_projects.validate"):
+        return [ProjectResponse(**data) for data in rows]
 
 def get_project(project_id: str) -> Optional[ProjectResponse]:
-    path = _get_project_path(project_id)
-    if not os.path.exists(path):
+    with span("storage.get_project.read"):
+        data = get_store().get(project_id)
+    if data is None:
         return None
-        
-    with open(path, "r") as f:
-        data = json.load(f)
+    with span("storage.get_project.validate"):
         return ProjectResponse(**data)
 
-def update_project(project_id: str, update_data: ProjectUpdate) -> Optional[ProjectResponse]:
-    current = get_project(project_id)
-    if not current:
+class _PendingWrite:
+    def __init__(self, mutate: Mutator):
+        self.mutate = mutate
+        self.done = False
+        self.result: Optional[dict] = None
+        self.error: Optional[BaseException] = None
+
+_pending_lock = threading.Lock()
+_pending_writes: Dict[str, List[_PendingWrite]] = {}
+
+def _write_project(project_id: str, mutate: Mutator) -> Optional[dict]:
+    """Apply `mutate` to the stored project under the project lock.
+
+    Saves are coalesced: the first save queued for a project waits
+    SAVE_COALESCE_MS for others to join, and whichever writer then gets the
+    lock applies every queued mutation in arrival order and persists the
+    result once, so a burst of N saves costs one write instead of N.
+    """
+    entry = _PendingWrite(mutate)
+    with _pending_lock:
+        queue = _pending_writes.setdefault(project_id, [])
+        queue.append(entry)
+        opens_batch = len(queue) == 1
+    if opens_batch and SAVE_COALESCE_MS > 0:
+        with span("storage.coalesce_wait"):
+            time.sleep(SAVE_COALESCE_MS / 1000)
+
+    began = time.perf_counter()
+    with _locks(project_id):
+        record_span("storage.lock_wait", time.perf_counter() - began)
+        if not entry.done:
+            with _pending_lock:
+                batch = _pending_writes.pop(project_id, [])
+
+            def apply_batch(data: dict) -> dict:
+                for pending in batch:
+                    try:
+                        data = pending.mutate(data)
+                    except Exception as e: # Only this save fails, the rest still land
+                        pending.error = e
+                return data
+
+            try:
+                with span("storage.write"):
+                    result = get_store().update(project_id, apply_batch)
+            except BaseException as e:
+                for pending in batch:
+                    pending.error = pending.error or e
+                    pending.done = True
+                raise
+            for pending in batch:
+                pending.result = result
+                pending.done = True
+
+    if entry.error is not None:
+        raise entry.error
+    return entry.result
+
+class RevisionConflict(ValueError):
+    """The client edited an older revision than the one stored."""
+
+def _check_revision(data_dict: dict, expected: Optional[int]):
+    current = data_dict.get("revision", 0)
+    if expected is not None and expected != current:
+        raise RevisionConflict(f"Project is at revision {current}, not {expected}")
+
+def _bump_revision(data_dict: dict):
+    data_dict["revision"] = data_dict.get("revision", 0) + 1
+    data_dict["updated_at"] = datetime.now().isoformat()
+
+def get_project_revision(project_id: str, revision: int) -> Optional[ProjectSchema]:
+    """Schema as it was at `revision`, if still in the history window."""
+    with span("storage.get_project_revision.read"):
+        data = get_store().get_revision(project_id, revision)
+    if data is None:
         return None
-    
-    # Update fields
-    data_dict = current.dict()
-    
-    if update_data.name:
-        data_dict["name"] = update_data.name
-    
-    if update_data.schema_data:
-        data_dict["schema_data"] = update_data.schema_data.dict()
-        
-    # Write back
-    with open(_get_project_path(project_id), "w") as f:
-        json.dump(data_dict, f, indent=2)
+    with span("storage.get_project_revision.validate"):
+        return ProjectSchema(**data)
+
+@timed("storage.get_project_owner")
+def get_project_owner(project_id: str) -> Optional[str]:
+    """Owner id of a project without loading its schema (None if it doesn't exist)."""
+    return get_store().get_owner(project_id)
+
+@timed("storage.update_project")
+def update_project(project_id: str, update_data: ProjectUpdate) -> Optional[ProjectResponse]:
+    def apply(data_dict: dict) -> dict:
+        _check_revision(data_dict, update_data.revision)
+        if update_data.name:
+            data_dict["name"] = update_data.name
         
+        if update_data.schema_data:
+            data_dict["schema_data"] = update_data.schema_data.dict()
+        _bump_revision(data_dict)
+        return data_dict
+
+    data_dict = _write_project(project_id, apply)
+    if data_dict is None:
+        return None
     return ProjectResponse(**data_dict)
 
+# Project-wide settings sections of ProjectSchema, validated on their own when patched
+SETTINGS_SECTIONS = {
+    "database": DatabaseSettings, "cache": CacheSettings, "auth": AuthSettings, "observability": ObservabilitySettings,
+}
+
+def _validate_patched_schema(schema: dict, paths: List[List[str]]) -> dict:
+    """Validate only the models/apis entries or settings sections a patch touched; anything broader gets a full check."""
+    scoped = all(
+        (len(p) >= 2 and p[0] in ("models", "apis")) or (len(p) >= 1 and p[0] in SETTINGS_SECTIONS)
+        for p in paths
+    )
+    if not scoped:
+        return ProjectSchema(**schema).dict()
+
+    for section in {p[0] for p in paths if p[0] in SETTINGS_SECTIONS}:
+        if not isinstance(schema.get(section, {}), dict):
+            raise JsonPatchError(f"{section} must be an object")
+        schema[section] = SETTINGS_SECTIONS[section](**schema.get(section, {})).dict()
+    paths = [p for p in paths if p[0] not in SETTINGS_SECTIONS]
+
+    if not isinstance(schema.get("models"), dict) or not isinstance(schema.get("apis"), dict):
+        raise JsonPatchError("schema_data must keep 'models' and 'apis' objects")
+
+    for section, name in {(p[0], p[1]) for p in paths}:
+        entries = schema[section]
+        if name not in entries:
+            continue # Removed
+        if section == "models":
+            if not isinstance(entries[name], dict):
+                raise JsonPatchError(f"models/{name} must be an object")
+            entries[name] = ModelDefinition(**entries[name]).dict()
+        elif not isinstance(entries[name], dict) or not all(
+            isinstance(k, str) and isinstance(v, str) for k, v in entries[name].items()
+        ):
+            raise JsonPatchError(f"apis/{name} must map actions to access levels")
+    return schema
+
+@timed("storage.patch_project")
+def patch_project(project_id: str, patch: ProjectPatch) -> Optional[ProjectPatchResult]:
+    """Apply RFC 6902 operations to schema_data if `patch.revision` is still current.
+
+    Raises RevisionConflict when the project moved on, MalformedPatchError when
+    an operation lacks a required member, JsonPatchError when the operations
+    cannot be applied or the resulting schema is invalid.
+    """
+    # exclude_unset: an omitted "value" must stay distinguishable from an explicit null
+    operations = [op.dict(by_alias=True, exclude_unset=True) for op in patch.operations]
+    check_operations(operations)
+    paths = touched_paths(operations)
+
+    def apply(data_dict: dict) -> dict:
+        _check_revision(data_dict, patch.revision)
+        schema = apply_patch(data_dict["schema_data"], operations)
+        if not isinstance(schema, dict):
+            raise JsonPatchError("schema_data must stay an object")
+        try:
+            with span("storage.patch_project.validate"):
+                schema = _validate_patched_schema(schema, paths)
+        except ValidationError as e:
+            raise JsonPatchError(str(e))
+        data_dict = dict(data_dict, schema_data=schema)
+        _bump_revision(data_dict)
+        return data_dict
+
+    data_dict = _write_project(project_id, apply)
+    if data_dict is None:
+        return None
+    return ProjectPatchResult(id=data_dict["id"], revision=data_dict["revision"], updated_at=data_dict["updated_at"])
+
+@timed("storage.delete_project")
 def delete_project(project_id: str) -> bool:
-    path = _get_project_path(project_id)
-    if os.path.exists(path):
-        os.remove(path)
-        return True
-    return False
+    with _locks(project_id):
+        deleted = get_store().delete(project_id)
+        if deleted:
+            _locks.discard(project_id)
+        return deleted
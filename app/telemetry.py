@@ -0,0 +1,181 @@
+"""Counters, latency histograms and timing spans for the builder itself.
+
+Spans wrap each storage call and generation stage; together with per-route
+request timings they are served as JSON at /api/metrics.
+"""
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Bucket upper bounds in seconds, from cached lookups to whole generations
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+class Histogram:
+    """Latency distribution of one series; quantiles are interpolated within buckets."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last one: above the largest bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = min(self.buckets[i] if i < len(self.buckets) else self.max, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.max
+
+    def snapshot(self) -> dict:
+        ms = lambda seconds: round(seconds * 1000, 3)
+        cumulative = 0
+        buckets = {}
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            buckets[f"{bound * 1000:g}"] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "total_ms": ms(self.total),
+            "mean_ms": ms(self.total / self.count) if self.count else 0.0,
+            "p50_ms": ms(self.quantile(0.5)),
+            "p95_ms": ms(self.quantile(0.95)),
+            "p99_ms": ms(self.quantile(0.99)),
+            "max_ms": ms(self.max),
+            "buckets_ms": buckets, # Upper bound in ms -> observations at or below it
+        }
+
+class Metrics:
+    """Process-wide registry: metric name -> series key -> counter value or histogram."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._histograms: Dict[str, Dict[str, Histogram]] = {}
+        self.started_at = time.time()
+
+    def inc(self, metric: str, key: str, amount: int = 1):
+        with self._lock:
+            series = self._counters.setdefault(metric, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, metric: str, key: str, seconds: float):
+        with self._lock:
+            series = self._histograms.setdefault(metric, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "uptime_s": round(time.time() - self.started_at, 1),
+                "counters": {metric: dict(sorted(series.items())) for metric, series in sorted(self._counters.items())},
+                "histograms": {
+                    metric: {key: histogram.snapshot() for key, histogram in sorted(series.items())}
+                    for metric, series in sorted(self._histograms.items())
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+metrics = Metrics()
+
+# Spans of the current unit of work, when someone asked for them (see collect_spans)
+_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("builder_trace", default=None)
+
+def record_span(name: str, seconds: float):
+    metrics.observe("stage_seconds", name, seconds)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((name, seconds))
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the block as stage `name`."""
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - began)
+
+def timed(name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Decorator: time every call of the function as stage `name`."""
+    def decorate(func: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+@contextmanager
+def collect_spans() -> Iterator[List[Tuple[str, float]]]:
+    """Also hand every span finished in this thread/context to the yielded list."""
+    trace: List[Tuple[str, float]] = []
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+def server_timing(spans: List[Tuple[str, float]]) -> str:
+    """Server-Timing header value: total time and call count per stage."""
+    totals: Dict[str, List[float]] = {}
+    for name, seconds in spans:
+        entry = totals.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+    return ", ".join(f'{name};dur={seconds * 1000:.2f};desc="calls: {calls}"' for name, (seconds, calls) in totals.items())
+
+class MetricsMiddleware:
+    """Counts and times every HTTP request under its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        began = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Timed until the body is sent, so streamed archives include their generation
+            path = getattr(scope.get("route"), "path", None) or "unmatched"
+            route = f"{scope['method']} {path}"
+            metrics.observe("http_request_seconds", route, time.perf_counter() - began)
+            metrics.inc("http_requests", f"{route} {status}")
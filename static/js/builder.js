@@ -38,6 +38,7 @@ async function loadProject() {
         }
         if (!res.ok) throw new Error("Failed to load");
         currentProject = await res.json();
+        savedEntries = snapshotEntries(currentProject.schema_data);
         renderUI();
     } catch (e) {
         console.error(e);
@@ -46,19 +47,111 @@ async function loadProject() {
     }
 }
 
-async function saveProject() {
-    // Send full update
-    await fetch(`${API_BASE}/projects/${PROJECT_ID}`, {
-        method: "PUT",
-        headers: getHeaders(),
-        body: JSON.stringify({
-            schema_data: currentProject.schema_data
-        })
+// Edits arrive in bursts (dragging, toggling selects), so saves are debounced
+// and sent one at a time: a burst becomes a single request and requests never race.
+// Only the models/apis entries that changed since the last save are sent, as
+// JSON Patch operations checked against the project revision.
+const SAVE_DEBOUNCE_MS = 400;
+let saveTimer = null;
+let saveChain = Promise.resolve();
+let savedEntries = {}; // "models/Post" or "database" -> JSON of what the server has
+const SETTINGS_SECTIONS = ["database", "cache", "auth", "observability"]; // Project-wide settings, patched as a whole
+
+function pointerToken(name) {
+    return name.replace(/~/g, "~0").replace(/\//g, "~1");
+}
+
+function snapshotEntries(schema) {
+    const entries = {};
+    ["models", "apis"].forEach(section => {
+        Object.entries(schema[section] || {}).forEach(([name, value]) => {
+            entries[`${section}/${name}`] = JSON.stringify(value);
+        });
     });
+    SETTINGS_SECTIONS.forEach(section => {
+        if (schema[section] !== undefined) entries[section] = JSON.stringify(schema[section]);
+    });
+    return entries;
+}
+
+function entryPath(key) {
+    const [section, name] = key.split(/\/(.*)/s);
+    return name === undefined ? `/${section}` : `/${section}/${pointerToken(name)}`;
 }
 
+function diffOperations(before, after) {
+    const ops = [];
+    Object.keys(after).forEach(key => {
+        if (before[key] === after[key]) return;
+        ops.push({
+            op: key in before ? "replace" : "add",
+            path: entryPath(key),
+            value: JSON.parse(after[key])
+        });
+    });
+    Object.keys(before).forEach(key => {
+        if (key in after) return;
+        ops.push({ op: "remove", path: entryPath(key) });
+    });
+    return ops;
+}
+
+function saveProject() {
+    clearTimeout(saveTimer);
+    saveTimer = setTimeout(flushSave, SAVE_DEBOUNCE_MS);
+    return Promise.resolve();
+}
+
+function flushSave() {
+    if (saveTimer === null) return saveChain;
+    clearTimeout(saveTimer);
+    saveTimer = null;
+
+    saveChain = saveChain.then(async () => {
+        currentProject.schema_data.apis = currentProject.schema_data.apis || {};
+        const entries = snapshotEntries(currentProject.schema_data);
+        const operations = diffOperations(savedEntries, entries);
+        if (operations.length === 0) return;
+
+        const res = await fetch(`${API_BASE}/projects/${PROJECT_ID}`, {
+            method: "PATCH",
+            headers: getHeaders(),
+            body: JSON.stringify({ revision: currentProject.revision, operations })
+        });
+        if (res.status === 409) {
+            alert("This project was changed in another window. Reloading the latest version.");
+            await loadProject();
+            return;
+        }
+        if (!res.ok) throw new Error(`Save failed (${res.status})`);
+        const result = await res.json();
+        currentProject.revision = result.revision;
+        savedEntries = entries;
+    }).catch(e => console.error("Save failed", e));
+    return saveChain;
+}
+
+window.addEventListener("beforeunload", () => {
+    if (saveTimer === null) return;
+    clearTimeout(saveTimer);
+    saveTimer = null;
+    const entries = snapshotEntries(currentProject.schema_data);
+    const operations = diffOperations(savedEntries, entries);
+    if (operations.length === 0) return;
+    fetch(`${API_BASE}/projects/${PROJECT_ID}`, {
+        method: "PATCH",
+        headers: getHeaders(),
+        body: JSON.stringify({ revision: currentProject.revision, operations }),
+        keepalive: true
+    });
+});
+
 function renderUI() {
     document.getElementById("project-name").innerText = currentProject.name;
+    document.getElementById("db-mode-select").value = (currentProject.schema_data.database || {}).mode || "sync";
+    document.getElementById("cache-toggle").checked = !!(currentProject.schema_data.cache || {}).enabled;
+    document.getElementById("stateless-auth-toggle").checked = !!(currentProject.schema_data.auth || {}).stateless;
+    document.getElementById("metrics-toggle").checked = !!(currentProject.schema_data.observability || {}).enabled;
 
     const models = currentProject.schema_data.models;
     const canvas = document.getElementById("canvas");
@@ -139,12 +232,24 @@ function createModelCard(name, modelDef) {
                     <span class="field-name">${fname}</span>
                     <span class="field-type">${f.type}</span>
                     ${f.required ? "<span class='badge-req'>*</span>" : ""}
+                    <button class="badge-toggle ${f.index ? 'active' : ''}" title="Index this column" onclick="toggleFieldFlag('${name}', '${fname}', 'index')">idx</button>
+                    <button class="badge-toggle ${f.unique ? 'active' : ''}" title="Unique values only" onclick="toggleFieldFlag('${name}', '${fname}', 'unique')">uniq</button>
                 </span>
                 <button class="btn-icon" onclick="deleteField('${name}', '${fname}')">×</button>
             </div>
         `;
     });
 
+    let indexesHtml = "";
+    (modelDef.indexes || []).forEach((index, i) => {
+        indexesHtml += `
+            <div class="index-row">
+                <span>${index.unique ? "Unique" : "Index"} (${index.fields.join(", ")})</span>
+                <button class="btn-icon" onclick="deleteIndex('${name}', ${i})">×</button>
+            </div>
+        `;
+    });
+
     card.innerHTML = `
         <div class="model-header">
             <span>${name}</span>
@@ -156,6 +261,8 @@ function createModelCard(name, modelDef) {
         <div class="model-fields">
             ${fieldsHtml}
             <button class="btn-sm btn-secondary w-full mt-2" onclick="openFieldModal('${name}')">+ Add Field</button>
+            ${indexesHtml}
+            <button class="btn-sm btn-secondary w-full mt-2" onclick="addIndex('${name}')">+ Composite Index</button>
             <div id="rels-${name}" style="margin-top: 0.5rem; font-size: 0.8rem; color: var(--primary);">
                 <!-- Relations shown here? Or just lines? -->
             </div>
@@ -269,7 +376,30 @@ document.addEventListener("DOMContentLoaded", () => {
 // --- Actions ---
 
 function setupEventListeners() {
-    document.getElementById("back-btn").onclick = () => window.location.href = "dashboard.html";
+    document.getElementById("back-btn").onclick = async () => {
+        await flushSave();
+        window.location.href = "dashboard.html";
+    };
+
+    document.getElementById("db-mode-select").onchange = async (e) => {
+        currentProject.schema_data.database = { ...(currentProject.schema_data.database || {}), mode: e.target.value };
+        await saveProject();
+    };
+
+    document.getElementById("cache-toggle").onchange = async (e) => {
+        currentProject.schema_data.cache = { ...(currentProject.schema_data.cache || {}), enabled: e.target.checked };
+        await saveProject();
+    };
+
+    document.getElementById("stateless-auth-toggle").onchange = async (e) => {
+        currentProject.schema_data.auth = { ...(currentProject.schema_data.auth || {}), stateless: e.target.checked };
+        await saveProject();
+    };
+
+    document.getElementById("metrics-toggle").onchange = async (e) => {
+        currentProject.schema_data.observability = { ...(currentProject.schema_data.observability || {}), enabled: e.target.checked };
+        await saveProject();
+    };
 
     // Add Model
     document.getElementById("add-model-btn").onclick = () => {
@@ -314,6 +444,8 @@ function setupEventListeners() {
         const name = document.getElementById("field-name-input").value.trim().toLowerCase();
         const type = document.getElementById("field-type-input").value;
         const required = document.getElementById("field-required-input").checked;
+        const index = document.getElementById("field-index-input").checked;
+        const unique = document.getElementById("field-unique-input").checked;
 
         if (!name) return alert("Field name required");
         if (name === "id") return alert("ID is automatic");
@@ -323,7 +455,7 @@ function setupEventListeners() {
         }
 
         currentProject.schema_data.models[currentEditingModel].fields[name] = {
-            type, required
+            type, required, index, unique
         };
 
         await saveProject();
@@ -340,6 +472,7 @@ function setupEventListeners() {
     // Download using Fetch for Auth
     document.getElementById("generate-btn").onclick = async () => {
         try {
+            await flushSave(); // Generate from the latest schema
             const res = await fetch(`${API_BASE}/projects/${PROJECT_ID}/generate`, {
                 headers: getHeaders()
             });
@@ -382,8 +515,39 @@ window.openFieldModal = (modelName) => {
     document.getElementById("field-modal").classList.remove("hidden");
 };
 
+window.toggleFieldFlag = async (modelName, fieldName, flag) => {
+    const field = currentProject.schema_data.models[modelName].fields[fieldName];
+    field[flag] = !field[flag];
+    await saveProject();
+    renderUI();
+};
+
+window.addIndex = async (modelName) => {
+    const modelDef = currentProject.schema_data.models[modelName];
+    const columns = ["id", ...Object.keys(modelDef.fields), ...Object.keys(modelDef.relations || {})];
+    const input = prompt(`Columns for the index, in order (comma separated).\nAvailable: ${columns.join(", ")}`);
+    if (!input) return;
+    const fields = input.split(",").map(f => f.trim()).filter(Boolean);
+    const unknown = fields.filter(f => !columns.includes(f));
+    if (fields.length < 2) return alert("A composite index needs at least two columns");
+    if (unknown.length) return alert(`Unknown columns: ${unknown.join(", ")}`);
+    const unique = confirm("Should this combination of values be unique?");
+    modelDef.indexes = [...(modelDef.indexes || []), { fields, unique }];
+    await saveProject();
+    renderUI();
+};
+
+window.deleteIndex = async (modelName, position) => {
+    const modelDef = currentProject.schema_data.models[modelName];
+    modelDef.indexes = (modelDef.indexes || []).filter((_, i) => i !== position);
+    await saveProject();
+    renderUI();
+};
+
 window.deleteField = async (modelName, fieldName) => {
     delete currentProject.schema_data.models[modelName].fields[fieldName];
+    const modelDef = currentProject.schema_data.models[modelName];
+    modelDef.indexes = (modelDef.indexes || []).filter(index => !index.fields.includes(fieldName));
     await saveProject();
     renderUI();
 };
@@ -0,0 +1,117 @@
+import pytest
+from app.json_patch import JsonPatchError, MalformedPatchError, apply_patch, parse_pointer, touched_paths
+from app.schemas import ProjectSchema
+from app.storage import _validate_patched_schema
+
+def test_pointer_unescapes_tilde_and_slash():
+    assert parse_pointer("/models/a~1b/c~0d") == ["models", "a/b", "c~d"]
+    # ~01 is "~1" literally, not "/": ~1 is unescaped before ~0
+    assert parse_pointer("/~01") == ["~1"]
+    assert parse_pointer("") == []
+
+def test_escaped_keys_are_written_and_read():
+    doc = {"models": {}}
+    doc = apply_patch(doc, [
+        {"op": "add", "path": "/models/a~1b", "value": 1},
+        {"op": "add", "path": "/models/c~0d", "value": 2},
+        {"op": "test", "path": "/models/a~1b", "value": 1},
+    ])
+    assert doc == {"models": {"a/b": 1, "c~d": 2}}
+
+def test_invalid_pointer_is_rejected():
+    with pytest.raises(JsonPatchError):
+        apply_patch({}, [{"op": "add", "path": "models", "value": 1}])
+
+def test_dash_appends_to_an_array():
+    doc = apply_patch({"items": [1, 2]}, [{"op": "add", "path": "/items/-", "value": 3}])
+    assert doc == {"items": [1, 2, 3]}
+
+def test_dash_is_only_valid_for_add():
+    with pytest.raises(JsonPatchError):
+        apply_patch({"items": [1]}, [{"op": "replace", "path": "/items/-", "value": 2}])
+    with pytest.raises(JsonPatchError):
+        apply_patch({"items": [1]}, [{"op": "remove", "path": "/items/-"}])
+
+def test_array_index_insert_and_bounds():
+    assert apply_patch([1, 3], [{"op": "add", "path": "/1", "value": 2}]) == [1, 2, 3]
+    assert apply_patch([1, 2], [{"op": "add", "path": "/2", "value": 3}]) == [1, 2, 3]
+    for bad in ("/3", "/01", "/-1"):
+        with pytest.raises(JsonPatchError):
+            apply_patch([1, 2], [{"op": "add", "path": bad, "value": 0}])
+
+def test_move_into_own_child_is_rejected():
+    doc = {"a": {"b": {}}}
+    with pytest.raises(JsonPatchError, match="children"):
+        apply_patch(doc, [{"op": "move", "from": "/a", "path": "/a/b/c"}])
+    assert doc == {"a": {"b": {}}}
+
+def test_move_to_a_sibling_with_a_shared_prefix():
+    doc = apply_patch({"a": 1}, [{"op": "move", "from": "/a", "path": "/ab"}])
+    assert doc == {"ab": 1}
+
+def test_move_onto_itself_keeps_the_value():
+    assert apply_patch({"a": 1}, [{"op": "move", "from": "/a", "path": "/a"}]) == {"a": 1}
+
+def test_failing_test_op_rejects_the_whole_patch():
+    doc = {"models": {"Post": {"fields": {}}}}
+    with pytest.raises(JsonPatchError, match="Test failed"):
+        apply_patch(doc, [
+            {"op": "add", "path": "/models/User", "value": {"fields": {}}},
+            {"op": "test", "path": "/models/Post/fields", "value": {"title": "string"}},
+        ])
+    assert doc == {"models": {"Post": {"fields": {}}}}
+
+def test_test_op_on_a_missing_path_fails():
+    with pytest.raises(JsonPatchError):
+        apply_patch({}, [{"op": "test", "path": "/missing", "value": None}])
+
+def test_input_document_is_not_modified():
+    doc = {"models": {"Post": {"fields": {"title": "string"}}}, "apis": {}}
+    patched = apply_patch(doc, [{"op": "remove", "path": "/models/Post/fields/title"}])
+    assert doc["models"]["Post"]["fields"] == {"title": "string"}
+    assert patched["models"]["Post"]["fields"] == {}
+    assert patched["apis"] is doc["apis"] # Untouched branches are shared, not copied
+
+@pytest.mark.parametrize("op", ["add", "replace", "test"])
+def test_value_is_required(op):
+    with pytest.raises(MalformedPatchError, match="requires 'value'"):
+        apply_patch({"a": 1}, [{"op": op, "path": "/a"}])
+
+def test_explicit_null_value_is_applied():
+    assert apply_patch({"a": 1}, [{"op": "replace", "path": "/a", "value": None}]) == {"a": None}
+
+@pytest.mark.parametrize("op", ["move", "copy"])
+def test_from_is_required(op):
+    with pytest.raises(MalformedPatchError, match="requires 'from'"):
+        apply_patch({"a": 1}, [{"op": op, "path": "/b"}])
+
+def test_unknown_op_is_rejected():
+    with pytest.raises(JsonPatchError, match="Unknown operation"):
+        apply_patch({}, [{"op": "merge", "path": "/a", "value": 1}])
+
+def test_touched_paths_skip_test_and_include_move_source():
+    assert touched_paths([
+        {"op": "test", "path": "/models/A", "value": {}},
+        {"op": "move", "from": "/models/A", "path": "/models/B"},
+    ]) == [["models", "B"], ["models", "A"]]
+
+def _patched_schema(operations):
+    # Patch an empty project schema, then validate it as PATCH /api/projects/{id} does
+    schema = apply_patch(ProjectSchema(models={}).dict(), operations)
+    return _validate_patched_schema(schema, touched_paths(operations))
+
+@pytest.mark.parametrize("operation", [
+    {"op": "add", "path": "/models/X", "value": 5},
+    {"op": "replace", "path": "/database", "value": 5},
+])
+def test_non_object_model_or_settings_section_is_rejected(operation):
+    with pytest.raises(JsonPatchError, match="must be an object"):
+        _patched_schema([operation])
+
+def test_valid_model_and_settings_patch_is_normalized():
+    schema = _patched_schema([
+        {"op": "add", "path": "/models/X", "value": {"fields": {"title": {"type": "string"}}}},
+        {"op": "replace", "path": "/database", "value": {"mode": "async"}},
+    ])
+    assert schema["database"]["mode"] == "async"
+    assert schema["models"]["X"]["fields"]["title"]["type"] == "string"